@@ -0,0 +1,134 @@
+"""Compara os motores de consulta (motores_consulta.py): confere se todos devolvem os mesmos
+resultados que o pandas e mede o tempo de cada operação.
+
+Uso:
+    python benchmark_motores.py                      # dados sintéticos (1 milhão de linhas)
+    python benchmark_motores.py --linhas 5000000
+    python benchmark_motores.py planilha.xlsx        # colunas de uma planilha real
+"""
+import argparse
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from motores_consulta import motores_disponiveis, obter_motor
+
+
+# Função para gerar um dataset parecido com as planilhas de pesquisa de campo
+def gerar_dados(linhas, semente=0):
+    aleatorio = np.random.default_rng(semente)
+    comunidades = np.array(["Centro", "Vila Aliança", "Vila Alianca", "vila aliança", "Norte", "Alto da Aliança", ""])
+    problemas = np.array(["Água contaminada", "Esgoto a céu aberto", "Falta de luz", "Lixo acumulado"])
+    renda = aleatorio.normal(1500, 400, linhas).round(2)
+    renda[aleatorio.random(linhas) < 0.05] = np.nan
+    return pd.DataFrame({
+        "Comunidade": comunidades[aleatorio.integers(0, len(comunidades), linhas)],
+        "Problema reportado": problemas[aleatorio.integers(0, len(problemas), linhas)],
+        "Idade": aleatorio.integers(16, 90, linhas),
+        "Renda": renda,
+        "Moradores": aleatorio.integers(1, 8, linhas).astype(float),
+    })
+
+
+# Função para medir o menor tempo de algumas repetições
+def cronometrar(funcao, repeticoes):
+    melhor = float("inf")
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+# Funções que comparam o resultado de um motor com o do pandas
+def iguais_arrays(esperado, obtido):
+    return np.array_equal(np.asarray(esperado), np.asarray(obtido))
+
+
+def iguais_series(esperado, obtido):
+    return esperado.index.tolist() == obtido.index.tolist() and esperado.tolist() == obtido.tolist()
+
+
+def iguais_grupos(esperado, obtido):
+    """Mesmos grupos e contagens; somas iguais a menos do arredondamento da ordem da soma"""
+    dimensoes = [c for c in esperado.columns if c == 'Registros' or not c.endswith((' - soma', ' - n'))]
+    dimensoes.remove('Registros')
+    # Ordena pelo texto: colunas com tipos misturados (30 e "30") não se comparam entre si
+    esperado = esperado.sort_values(dimensoes, ignore_index=True, key=lambda coluna: coluna.astype(str))
+    obtido = obtido.sort_values(dimensoes, ignore_index=True, key=lambda coluna: coluna.astype(str))
+    if list(esperado.columns) != list(obtido.columns) or len(esperado) != len(obtido):
+        return False
+    for coluna in esperado.columns:
+        if coluna.endswith(' - soma'):
+            if not np.allclose(esperado[coluna].to_numpy(float), obtido[coluna].to_numpy(float), rtol=1e-9):
+                return False
+        elif not esperado[coluna].astype(object).equals(obtido[coluna].astype(object)):
+            return False
+    return True
+
+
+def iguais_parquet(esperado, obtido):
+    return pd.read_parquet(io.BytesIO(esperado)).equals(pd.read_parquet(io.BytesIO(obtido)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("planilha", nargs="?", help="planilha .xlsx (por padrão, dados sintéticos)")
+    parser.add_argument("--linhas", type=int, default=1_000_000, help="linhas dos dados sintéticos")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    df = pd.read_excel(args.planilha) if args.planilha else gerar_dados(args.linhas)
+    colunas_texto = [c for c in df.columns if df[c].dtype == 'object']
+    colunas_numericas = [c for c in df.columns if np.issubdtype(df[c].dtype, np.number)]
+    if not colunas_texto or not colunas_numericas:
+        sys.exit("A planilha precisa ter ao menos uma coluna de texto e uma numérica.")
+    texto, numerica = colunas_texto[0], colunas_numericas[0]
+    metricas = colunas_numericas[1:3] or colunas_numericas[:1]
+
+    # Códigos por linha como os do app (chave normalizada; -1 = vazio)
+    codigos, chaves = pd.factorize(df[texto].astype(str).str.lower())
+    codigos = codigos.astype(np.int32)
+    selecionados = list(range(0, len(chaves), 2))
+    mascara = (np.arange(len(df)) % 3) != 0
+    valores = df[texto].dropna().unique()[:3].tolist()
+    inicio, fim = df[numerica].quantile([0.25, 0.75]).tolist()
+
+    operacoes = [
+        ("isin (códigos normalizados)", lambda m: m.mascara_codigos(codigos, selecionados), iguais_arrays),
+        ("isin (valores)", lambda m: m.mascara_valores(df[texto], valores), iguais_arrays),
+        ("faixa numérica", lambda m: m.mascara_faixa(df[numerica], inicio, fim), iguais_arrays),
+        ("contagem por faceta", lambda m: m.contar_codigos(codigos, mascara, len(chaves)), iguais_arrays),
+        ("valores únicos", lambda m: m.valores_unicos(df[texto]), iguais_arrays),
+        ("top-k (value_counts)", lambda m: m.mais_frequentes(df[texto], 10), iguais_series),
+        ("agrupamento", lambda m: m.agrupar(df, [texto, colunas_texto[-1]], metricas), iguais_grupos),
+        ("exportar CSV", lambda m: m.exportar_csv(df), lambda a, b: a == b),
+        ("exportar Parquet", lambda m: m.exportar_parquet(df), iguais_parquet),
+    ]
+
+    motores = [obter_motor(nome) for nome in motores_disponiveis()]
+    print(f"{len(df)} linhas x {len(df.columns)} colunas | motores: {', '.join(m.nome for m in motores)}\n")
+    print(f"{'operação':<30}{'motor':<10}{'tempo (ms)':>12}{'x pandas':>10}  resultado")
+
+    divergencias = 0
+    for nome_operacao, operacao, comparar in operacoes:
+        tempo_pandas, esperado = cronometrar(lambda: operacao(motores[0]), args.repeticoes)
+        print(f"{nome_operacao:<30}{'pandas':<10}{tempo_pandas * 1000:>12.1f}{1:>10.2f}  referência")
+        for motor in motores[1:]:
+            tempo, obtido = cronometrar(lambda: operacao(motor), args.repeticoes)
+            igual = comparar(esperado, obtido)
+            divergencias += not igual
+            print(f"{'':<30}{motor.nome:<10}{tempo * 1000:>12.1f}{tempo_pandas / tempo:>10.2f}  "
+                  f"{'igual' if igual else 'DIVERGENTE'}")
+
+    if divergencias:
+        sys.exit(f"\n{divergencias} resultado(s) divergente(s) do pandas")
+    print("\nTodos os motores produziram os mesmos resultados do pandas.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,48 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import io
 import unicodedata
 import re
+import heapq
+import hashlib
+import json
+import threading
+import time
+import openpyxl
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfgen import canvas
+import os
+import tempfile
+import weakref
+from pandas.io.parsers import TextParser
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+
+from motores_consulta import motores_disponiveis, obter_motor
+from perfil_aproximado import esbocar_serie
+
+# Quantidade de colunas por página nos seletores de colunas (planilhas muito largas)
+TAMANHO_PAGINA_COLUNAS = 100
+
+# Ingestão em segundo plano: linhas lidas antes de publicar a prévia e intervalo de atualização do progresso
+LINHAS_PRIMEIRO_BLOCO = 200
+LINHAS_POR_BLOCO = 5000
+# Planilhas a partir deste tamanho começam no perfil aproximado (esboços no lugar das contagens exatas)
+LINHAS_PERFIL_APROXIMADO = 500_000
+# Valores mais frequentes oferecidos na seleção enquanto a coluna só tem o perfil aproximado
+OPCOES_PERFIL_APROXIMADO = 50
+# Linhas amostradas por coluna no perfil aproximado (colunas maiores são esboçadas por amostra)
+LINHAS_AMOSTRA_PERFIL = 200_000
+
+# Uploads acima deste tamanho são gravados em disco e lidos direto do arquivo temporário
+LIMITE_SPOOL_BYTES = 32 * 1024 * 1024
+
+# Formatos testados na detecção de colunas de data (dia primeiro, como nas planilhas de campo)
+FORMATOS_DATA = [
+    '%d/%m/%Y', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%y',
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d-%m-%Y', '%d.%m.%Y',
+]
 
 # Configuração da página
 st.set_page_config(
@@ -27,6 +65,14 @@ def normalizar_texto(texto):
     texto = unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('ASCII')
     return texto.lower().strip()
 
+# Função para amostrar os primeiros valores distintos de uma coluna
+def amostrar_valores_coluna(dados_coluna, quantidade=3, linhas_iniciais=1000):
+    """Primeiros valores distintos não nulos, olhando só o início da coluna quando ele basta"""
+    valores = dados_coluna.head(linhas_iniciais).dropna().unique()
+    if len(valores) < quantidade and len(dados_coluna) > linhas_iniciais:
+        valores = dados_coluna.dropna().unique()
+    return valores[:quantidade]
+
 # Função para criar label descritivo das colunas
 def criar_label_coluna(nome_coluna, dados_coluna, mostrar_numero_coluna=False, numero_coluna=None, max_chars=30):
     """Cria um label descritivo com nome da coluna e amostra de valores"""
@@ -39,7 +85,7 @@ def criar_label_coluna(nome_coluna, dados_coluna, mostrar_numero_coluna=False, n
     else:
         prefixo = ""
     
-    valores_nao_vazios = dados_coluna.dropna().unique()
+    valores_nao_vazios = amostrar_valores_coluna(dados_coluna)
     if len(valores_nao_vazios) > 0:
         amostra_valores = [str(x) for x in valores_nao_vazios[:3] if str(x) not in ['', 'nan', 'NaN']]
         if amostra_valores:
@@ -50,48 +96,1352 @@ def criar_label_coluna(nome_coluna, dados_coluna, mostrar_numero_coluna=False, n
     
     return f"{prefixo}{nome_display} │ 📝 {len(dados_coluna.dropna())} valores"
 
-# Função para buscar valores similares
-def encontrar_valores_similares(valor_busca, lista_valores, limite=5):
-    """Encontra valores similares na lista (busca case insensitive e sem acentos)"""
+# Função para calcular a chave do dataset (hash do conteúdo do arquivo)
+def calcular_chave_dataset(arquivo, tamanho_bloco=1024 * 1024):
+    """Gera um hash do conteúdo do arquivo para identificar o dataset nos caches
+    
+    O hash é guardado na sessão por upload, para não reler o arquivo a cada rerun.
+    """
+    registro = st.session_state.get('chave_upload')
+    if registro is not None and registro[0] == arquivo.file_id:
+        return registro[1]
+    
+    hash_arquivo = hashlib.sha1()
+    arquivo.seek(0)
+    for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+        hash_arquivo.update(bloco)
+    arquivo.seek(0)
+    st.session_state['chave_upload'] = (arquivo.file_id, hash_arquivo.hexdigest())
+    return hash_arquivo.hexdigest()
+
+# Função para apagar arquivos temporários (usada na limpeza da sessão e ao fim da leitura)
+def remover_arquivos_temporarios(caminhos):
+    for caminho in list(caminhos):
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+        caminhos.discard(caminho)
+
+# Arquivos temporários da sessão: apagados quando o estado da sessão é descartado ou o servidor encerra
+class ArquivosTemporariosSessao:
+    def __init__(self):
+        self.caminhos = set()
+        weakref.finalize(self, remover_arquivos_temporarios, self.caminhos)
+
+# Função para preparar a origem da leitura do upload
+def preparar_origem_upload(arquivo, tamanho_bloco=1024 * 1024):
+    """Uploads grandes são copiados em blocos para um arquivo temporário e lidos do disco;
+    os pequenos são lidos da memória. Retorna (origem, caminho_temporario ou None)"""
+    if arquivo.size <= LIMITE_SPOOL_BYTES:
+        # getvalue() devolve os próprios bytes do upload e o BytesIO os compartilha (sem cópia);
+        # a leitura em segundo plano ganha uma posição própria, separada da do UploadedFile
+        return io.BytesIO(arquivo.getvalue()), None
+    
+    if 'arquivos_temporarios' not in st.session_state:
+        st.session_state['arquivos_temporarios'] = ArquivosTemporariosSessao()
+    descritor, caminho = tempfile.mkstemp(prefix='consulta_', suffix='.xlsx')
+    st.session_state['arquivos_temporarios'].caminhos.add(caminho)
+    
+    with os.fdopen(descritor, 'wb') as destino:
+        arquivo.seek(0)
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            destino.write(bloco)
+        arquivo.seek(0)
+    return open(caminho, 'rb'), caminho
+
+# Função para converter uma linha do openpyxl como o leitor do pandas faz
+def converter_linha_excel(linha):
+    """Vazio vira '', float inteiro vira int e as células vazias do final são descartadas"""
+    convertida = [
+        "" if valor is None else int(valor) if isinstance(valor, float) and valor.is_integer() else valor
+        for valor in linha
+    ]
+    while convertida and convertida[-1] == "":
+        convertida.pop()
+    return convertida
+
+# Função para transformar as linhas lidas em DataFrame (mesma inferência de tipos do pd.read_excel)
+def montar_dataframe_excel(linhas):
+    if not linhas:
+        return pd.DataFrame()
+    largura = max(len(linha) for linha in linhas)
+    linhas = [linha + [""] * (largura - len(linha)) for linha in linhas]
+    return TextParser(linhas, header=0).read()
+
+# Função para preparar o DataFrame lido
+def preparar_dataframe(df):
+    """Remove colunas vazias e preenche NaN com string vazia nas colunas de texto"""
+    # Remover colunas completamente vazias
+    df = df.dropna(axis=1, how='all')
+    
+    # Preencher NaN com string vazia para colunas de texto
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].fillna('')
+    return df
+
+# Função para converter um texto numérico (aceita vírgula decimal e ponto de milhar)
+def converter_textos_numericos(texto):
+    """Versão vetorizada: '1.234,56' → 1234.56, '1.234' → 1234, '12,5' → 12.5, '30' → 30; o resto
+    (inclusive 'inf' e 'nan' escritos como texto) vira NaN
+    
+    Pontos de milhar seguem a regra brasileira com ou sem vírgula decimal, então o parse genérico
+    (ponto decimal) só vê os textos sem esse padrão.
+    """
+    formato_brasileiro = texto.str.fullmatch(r'-?[1-9]\d{0,2}(\.\d{3})+(,\d+)?|-?\d+,\d+').fillna(False).astype(bool)
+    numeros = pd.to_numeric(texto.where(~formato_brasileiro), errors='coerce').astype(float)
+    if formato_brasileiro.any():
+        numeros[formato_brasileiro] = pd.to_numeric(
+            texto[formato_brasileiro].str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
+            errors='coerce'
+        )
+    return numeros.where(np.isfinite(numeros))
+
+# Função para promover colunas de texto quase todas numéricas
+def inferir_colunas_numericas(df, tamanho_amostra=200, proporcao_minima=0.9):
+    """Converte para número as colunas de texto em que quase todas as células são números
+    (ex.: idade com alguns "n/a" ou "30 anos")
+    
+    Retorna o DataFrame convertido (usado nos filtros e nas estatísticas), os textos originais das
+    células que não viraram número e a coluna original de cada coluna promovida (exibida e exportada
+    no lugar dos números). Colunas com zeros à esquerda ou só com inteiros longos (códigos, telefones,
+    documentos) continuam como texto.
+    """
+    celulas_nao_numericas = {}
+    textos_originais = {}
+    for coluna in df.columns:
+        if df[coluna].dtype != 'object':
+            continue
+        texto = df[coluna].astype(str).str.strip()
+        preenchidas = texto != ''
+        amostra = texto[preenchidas].head(tamanho_amostra)
+        if len(amostra) == 0 or converter_textos_numericos(amostra).notna().mean() < proporcao_minima:
+            continue
+        if texto.str.match(r'-?0\d').any():
+            continue
+        
+        numeros = converter_textos_numericos(texto)
+        nao_numericas = preenchidas & numeros.isna()
+        if 1 - nao_numericas.sum() / preenchidas.sum() < proporcao_minima:
+            continue
+        if texto[preenchidas & numeros.notna()].str.fullmatch(r'[+-]?\d{8,}').all():
+            continue
+        textos_originais[coluna] = df[coluna].where(df[coluna].isna(), df[coluna].astype(str))
+        df[coluna] = numeros.astype(float)
+        celulas_nao_numericas[coluna] = texto[nao_numericas]
+    return df, celulas_nao_numericas, textos_originais
+
+# Função para devolver o texto original das colunas promovidas a número (exibição e exportação)
+def com_textos_originais(df_parcial, textos_originais):
+    colunas = [coluna for coluna in textos_originais if coluna in df_parcial.columns]
+    if not colunas:
+        return df_parcial
+    saida = df_parcial.copy(deep=False)
+    for coluna in colunas:
+        saida[coluna] = textos_originais[coluna].loc[df_parcial.index]
+    return saida
+
+# Função para comparar uma nova versão da planilha com a anterior, linha a linha
+def comparar_versoes(df_base, df):
+    """Casa as linhas idênticas das duas versões pelo hash da linha inteira (sem comparar pares)
+    
+    Retorna a origem de cada linha nova (posição na versão anterior, ou -1) e as linhas inseridas,
+    removidas e alteradas. Uma linha nova sem par exato conta como alteração da linha anterior que
+    ocupa o mesmo lugar depois da última linha igual (mesmo com linhas removidas ou inseridas antes).
+    """
+    if list(df_base.columns) != list(df.columns):
+        return {'origem': None, 'inseridas': None, 'removidas': None, 'alteradas': None, 'iguais': 0}
+    
+    def chaves_linhas(dados):
+        hashes = pd.Series(pd.util.hash_pandas_object(dados, index=False).to_numpy())
+        # Linhas repetidas dentro da mesma versão são casadas pela ordem de ocorrência
+        return pd.DataFrame({'hash': hashes, 'ocorrencia': hashes.groupby(hashes).cumcount()})
+    
+    pares = chaves_linhas(df_base).reset_index(names='base').merge(
+        chaves_linhas(df).reset_index(names='nova'), on=['hash', 'ocorrencia']
+    )
+    origem = np.full(len(df), -1, dtype=np.int64)
+    origem[pares['nova'].to_numpy()] = pares['base'].to_numpy()
+    
+    sem_par_base = np.setdiff1d(np.arange(len(df_base)), pares['base'].to_numpy())
+    sem_par_nova = np.flatnonzero(origem < 0)
+    if sem_par_nova.size == 0:
+        # Planilha só salva de novo, ou só com linhas removidas: nada inserido nem alterado
+        nenhuma = np.array([], dtype=np.int64)
+        return {'origem': origem, 'inseridas': nenhuma, 'removidas': sem_par_base, 'alteradas': nenhuma, 'iguais': len(pares)}
+    
+    # Cada trecho de linhas novas sem par é alinhado logo após a última linha igual que o precede
+    ultima_igual = pd.Series(np.where(origem >= 0, origem, np.nan)).ffill().fillna(-1).to_numpy(dtype=np.int64)
+    inicio_trecho = np.r_[True, np.diff(sem_par_nova) != 1]
+    primeira_do_trecho = sem_par_nova[inicio_trecho][np.cumsum(inicio_trecho) - 1]
+    candidatas = ultima_igual[sem_par_nova] + 1 + (sem_par_nova - primeira_do_trecho)
+    base_sem_par = np.zeros(len(df_base) + 1, dtype=bool)
+    base_sem_par[sem_par_base] = True
+    validas = base_sem_par[np.minimum(candidatas, len(df_base))]
+    alteradas_base, primeiras = np.unique(candidatas[validas], return_index=True)
+    alteradas = np.sort(sem_par_nova[validas][primeiras])
+    return {
+        'origem': origem,
+        'inseridas': np.setdiff1d(sem_par_nova, alteradas),
+        'removidas': np.setdiff1d(sem_par_base, alteradas_base),
+        'alteradas': alteradas,
+        'iguais': len(pares),
+    }
+
+# Função para obter a versão anterior registrada para um dataset
+def obter_versao_base(chave_dataset):
+    """(df anterior, chave anterior, origem das linhas) quando o dataset é uma nova versão já comparada"""
+    versao = obter_ingestao(chave_dataset)['versao']
+    if versao is None or versao['origem'] is None:
+        return None
+    base = obter_ingestao(versao['chave_base'])
+    if base['df'] is None:
+        return None
+    return base['df'], versao['chave_base'], versao['origem']
+
+# Estado inicial da ingestão (também usado para tentar de novo depois de uma falha)
+def estado_inicial_ingestao():
+    return {
+        'estado': 'pendente',  # pendente → lendo → convertendo → (comparando) → perfilando → pronto (ou erro)
+        'linhas_lidas': 0,
+        'total_linhas': None,
+        'colunas_perfiladas': 0,
+        'primeiro_bloco': None,
+        'df': None,
+        'celulas_nao_numericas': {},
+        'textos_originais': {},
+        'perfil_aproximado': False,
+        'versao': None,
+        'erro': None,
+        'inicio': None,
+        'tempo_primeira_linha': None,
+        'tempo_leitura': None,
+        'tempo_total': None,
+    }
+
+# Estado compartilhado da ingestão de um dataset (reaproveitado entre reruns e sessões)
+@st.cache_resource(show_spinner=False, max_entries=8)
+def obter_ingestao(chave_dataset):
+    return {'trava': threading.Lock(), **estado_inicial_ingestao()}
+
+# Função executada na thread de ingestão
+def ingerir_planilha(ingestao, origem, chave_dataset, caminho_temporario=None, chave_base=None):
+    """Lê a planilha em blocos, publica o primeiro bloco assim que fica pronto e depois
+    perfila as colunas (labels e índices de valores) aquecendo os caches
+    
+    Com uma versão anterior já carregada (chave_base), as linhas são comparadas antes do perfil
+    e os índices de valores são atualizados só nas linhas novas ou alteradas.
+    """
+    try:
+        ingestao['estado'] = 'lendo'
+        try:
+            pasta = openpyxl.load_workbook(origem, read_only=True, data_only=True)
+            planilha = pasta.worksheets[0]
+            if planilha.max_row:
+                ingestao['total_linhas'] = max(planilha.max_row - 1, 0)
+            
+            # A primeira linha é o cabeçalho; linhas vazias no fim da planilha são descartadas
+            linhas = []
+            ultima_com_dados = -1
+            for numero_linha, linha in enumerate(planilha.iter_rows(values_only=True)):
+                convertida = converter_linha_excel(linha)
+                if convertida:
+                    ultima_com_dados = numero_linha
+                linhas.append(convertida)
+                
+                if numero_linha == LINHAS_PRIMEIRO_BLOCO:
+                    ingestao['primeiro_bloco'] = preparar_dataframe(montar_dataframe_excel(linhas[:ultima_com_dados + 1]))
+                    ingestao['tempo_primeira_linha'] = time.perf_counter() - ingestao['inicio']
+                if numero_linha % LINHAS_POR_BLOCO == 0:
+                    ingestao['linhas_lidas'] = numero_linha
+            pasta.close()
+        finally:
+            # Liberar o buffer (ou o arquivo temporário) assim que a leitura termina
+            origem.close()
+            if caminho_temporario is not None:
+                remover_arquivos_temporarios({caminho_temporario})
+        
+        del linhas[ultima_com_dados + 1:]
+        ingestao['linhas_lidas'] = max(len(linhas) - 1, 0)
+        ingestao['estado'] = 'convertendo'
+        df = preparar_dataframe(montar_dataframe_excel(linhas))
+        del linhas
+        df, ingestao['celulas_nao_numericas'], ingestao['textos_originais'] = inferir_colunas_numericas(df)
+        if ingestao['primeiro_bloco'] is None:
+            ingestao['primeiro_bloco'] = df.head(LINHAS_PRIMEIRO_BLOCO)
+            ingestao['tempo_primeira_linha'] = time.perf_counter() - ingestao['inicio']
+        ingestao['df'] = df
+        ingestao['perfil_aproximado'] = len(df) >= LINHAS_PERFIL_APROXIMADO
+        ingestao['tempo_leitura'] = time.perf_counter() - ingestao['inicio']
+        
+        if chave_base is not None:
+            base = obter_ingestao(chave_base)
+            if base['estado'] == 'pronto':
+                ingestao['estado'] = 'comparando'
+                ingestao['versao'] = dict(comparar_versoes(base['df'], df), chave_base=chave_base)
+        
+        # Perfil das colunas em segundo plano: os filtros só aparecem quando estiver pronto
+        ingestao['estado'] = 'perfilando'
+        indexar_colunas(df, chave_dataset)
+        for idx in range(min(TAMANHO_PAGINA_COLUNAS, len(df.columns))):
+            rotulo_coluna(df, chave_dataset, True, idx)
+        colunas_data = detectar_colunas_data(df, chave_dataset)
+        for coluna in df.columns:
+            if coluna in colunas_data:
+                indexar_ordenacao(colunas_data[coluna], chave_dataset, coluna)
+            elif df[coluna].dtype in ['object', 'string']:
+                if ingestao['perfil_aproximado']:
+                    esbocar_coluna(df[coluna], chave_dataset, coluna)
+                else:
+                    contar_valores_coluna(df[coluna], chave_dataset, coluna)
+            elif np.issubdtype(df[coluna].dtype, np.number):
+                indexar_ordenacao(df[coluna], chave_dataset, coluna)
+            ingestao['colunas_perfiladas'] += 1
+        
+        ingestao['tempo_total'] = time.perf_counter() - ingestao['inicio']
+        ingestao['estado'] = 'pronto'
+    except Exception as e:
+        ingestao['erro'] = e
+        ingestao['estado'] = 'erro'
+
+# Função para disparar a ingestão (uma única thread por dataset)
+def iniciar_ingestao(ingestao, arquivo, chave_dataset, chave_base=None):
+    with ingestao['trava']:
+        # Uma falha não fica em cache: a próxima execução (de qualquer sessão) lê a planilha de novo
+        if ingestao['estado'] == 'erro':
+            ingestao.update(estado_inicial_ingestao())
+        if ingestao['estado'] != 'pendente':
+            return
+        ingestao['estado'] = 'lendo'
+        ingestao['inicio'] = time.perf_counter()
+        try:
+            origem, caminho_temporario = preparar_origem_upload(arquivo)
+        except Exception as e:
+            ingestao['erro'] = e
+            ingestao['estado'] = 'erro'
+            return
+        trabalhador = threading.Thread(
+            target=ingerir_planilha,
+            args=(ingestao, origem, chave_dataset, caminho_temporario, chave_base),
+            name=f"ingestao-{chave_dataset[:8]}",
+            daemon=True
+        )
+        # Os caches do Streamlit usados pelo perfil esperam o contexto da sessão
+        add_script_run_ctx(trabalhador)
+        trabalhador.start()
+
+# Função para acompanhar a ingestão mostrando progresso e as primeiras linhas
+def aguardar_ingestao(ingestao, intervalo=0.25):
+    """Bloqueia a execução do script até os dados estarem prontos, atualizando a tela a cada intervalo"""
+    area_progresso = st.empty()
+    while ingestao['estado'] not in ('pronto', 'erro'):
+        with area_progresso.container():
+            total = ingestao['total_linhas']
+            if ingestao['estado'] == 'perfilando':
+                total_colunas = max(len(ingestao['df'].columns), 1)
+                st.progress(
+                    min(ingestao['colunas_perfiladas'] / total_colunas, 1.0),
+                    text=f"🧮 Preparando filtros: {ingestao['colunas_perfiladas']} de {total_colunas} colunas"
+                )
+            elif ingestao['estado'] == 'comparando':
+                st.progress(1.0, text="🔍 Comparando com a versão anterior")
+            elif ingestao['estado'] == 'convertendo':
+                st.progress(1.0, text=f"🔄 Convertendo tipos de {ingestao['linhas_lidas']} linhas")
+            else:
+                st.progress(
+                    min(ingestao['linhas_lidas'] / total, 1.0) if total else 0.0,
+                    text=f"⏳ Lendo planilha: {ingestao['linhas_lidas']} de {total or '?'} linhas"
+                )
+            
+            if ingestao['primeiro_bloco'] is not None:
+                st.caption(f"⚡ Primeiras linhas disponíveis em {ingestao['tempo_primeira_linha']:.2f}s "
+                           f"(os filtros aparecem quando a carga terminar)")
+                st.dataframe(ingestao['primeiro_bloco'].head(20), use_container_width=True)
+        time.sleep(intervalo)
+    area_progresso.empty()
+    
+    if ingestao['estado'] == 'erro':
+        raise ingestao['erro']
+    return ingestao['df']
+
+# Função para pré-calcular a frequência dos valores de uma coluna
+@st.cache_resource(show_spinner=False, max_entries=256)
+def contar_valores_coluna(_dados_coluna, chave_dataset, coluna):
+    """Conta as linhas de cada valor da coluna e guarda sua forma normalizada (uma vez por dataset)
+    
+    Também gera os códigos por linha da chave normalizada (-1 = vazio), usados nos filtros e contagens.
+    Numa nova versão do dataset, parte das contagens da versão anterior.
+    """
+    versao_base = obter_versao_base(chave_dataset)
+    if versao_base is not None:
+        df_base, chave_base, origem = versao_base
+        if coluna in df_base.columns:
+            anteriores = contar_valores_coluna(df_base[coluna], chave_base, coluna)
+            return atualizar_contagens_coluna(anteriores, df_base[coluna], _dados_coluna, origem)
+    
+    codigos_brutos, valores_brutos = pd.factorize(_dados_coluna.astype(str), use_na_sentinel=False)
+    valores_brutos = np.asarray(valores_brutos, dtype=object)
+    validos = ~np.isin(valores_brutos, ['', 'nan', 'NaN'])
+    frequencias_brutas = np.bincount(codigos_brutos, minlength=len(valores_brutos))
+    
+    # Variações de acento/maiúsculas compartilham a mesma chave normalizada
+    normalizados_brutos = [normalizar_texto(valor) for valor in valores_brutos]
+    codigo_chave_bruto, chaves = pd.factorize(pd.Series(normalizados_brutos, dtype=object))
+    codigo_chave_bruto = np.where(validos, codigo_chave_bruto, -1)
+    
+    valores = valores_brutos[validos].tolist()
+    codigo_chave = codigo_chave_bruto[validos]
+    return {
+        'valores': valores,
+        'normalizados': [normalizados_brutos[i] for i in np.flatnonzero(validos)],
+        'frequencias': frequencias_brutas[validos],
+        'codigos': codigo_chave_bruto[codigos_brutos].astype(np.int32),
+        'codigos_valores': codigo_chave.astype(np.int64),
+        'chaves': list(chaves),
+        'posicao_chave': {chave: i for i, chave in enumerate(chaves)},
+        'codigo_valor': dict(zip(valores, codigo_chave.tolist())),
+    }
+
+# Função para esboçar os valores de uma coluna (perfil aproximado, sem as contagens exatas)
+@st.cache_resource(show_spinner=False, max_entries=256)
+def esbocar_coluna(_dados_coluna, chave_dataset, coluna):
+    """Valores distintos (HyperLogLog) e mais frequentes (Misra-Gries) de uma amostra das linhas, com
+    os esboços dos blocos mesclados; memória fixa por coluna, qualquer que seja o número de valores"""
+    return esbocar_serie(_dados_coluna, linhas_amostra=LINHAS_AMOSTRA_PERFIL)
+
+# Callback do botão que pede o perfil exato de uma coluna
+def calcular_perfil_exato(coluna):
+    st.session_state[f"exato_{coluna}"] = True
+
+# Função para atualizar as contagens de uma coluna a partir da versão anterior
+def atualizar_contagens_coluna(anteriores, dados_base, dados_coluna, origem):
+    """Reaproveita códigos e normalizações das linhas iguais; só as linhas novas/alteradas são
+    convertidas e normalizadas, e as frequências recebem a diferença"""
+    reaproveitadas = origem >= 0
+    codigos = np.empty(len(dados_coluna), dtype=np.int32)
+    codigos[reaproveitadas] = anteriores['codigos'][origem[reaproveitadas]]
+    
+    # Frequências: retirar as linhas que saíram (valores vazios não estão no índice).
+    # As estruturas de `anteriores` estão no cache da versão anterior e não podem ser alteradas
+    frequencias = pd.Series(anteriores['frequencias'].copy(), index=pd.Index(anteriores['valores'], dtype=object))
+    saiu = np.ones(len(dados_base), dtype=bool)
+    saiu[origem[reaproveitadas]] = False
+    frequencias -= dados_base[saiu].astype(str).value_counts().reindex(frequencias.index, fill_value=0).to_numpy()
+    
+    # Linhas que entraram: só os valores ainda desconhecidos passam pela normalização
+    chaves = anteriores['chaves']
+    posicao_chave = anteriores['posicao_chave']
+    codigo_valor = anteriores['codigo_valor']
+    novas = np.flatnonzero(~reaproveitadas)
+    codigos_brutos, valores_brutos = pd.factorize(dados_coluna.iloc[novas].astype(str), use_na_sentinel=False)
+    quantidades = np.bincount(codigos_brutos, minlength=len(valores_brutos))
+    codigo_chave_bruto = np.full(len(valores_brutos), -1, dtype=np.int32)
+    valores_novos, normalizados_novos, codigos_novos, frequencias_novas = [], [], [], []
+    for i, valor in enumerate(valores_brutos):
+        if valor in ('', 'nan', 'NaN'):
+            continue
+        if valor in codigo_valor:
+            codigo_chave_bruto[i] = codigo_valor[valor]
+            frequencias[valor] += quantidades[i]
+            continue
+        normalizado = normalizar_texto(valor)
+        if normalizado not in posicao_chave:
+            if posicao_chave is anteriores['posicao_chave']:
+                chaves, posicao_chave = list(chaves), dict(posicao_chave)
+            posicao_chave[normalizado] = len(chaves)
+            chaves.append(normalizado)
+        codigo_chave_bruto[i] = posicao_chave[normalizado]
+        valores_novos.append(valor)
+        normalizados_novos.append(normalizado)
+        codigos_novos.append(posicao_chave[normalizado])
+        frequencias_novas.append(quantidades[i])
+    codigos[novas] = codigo_chave_bruto[codigos_brutos]
+    
+    # Valores que sumiram saem das listas; os novos entram no fim
+    presentes = frequencias.to_numpy() > 0
+    valores = frequencias.index[presentes].tolist() + valores_novos
+    codigos_valores = np.concatenate([anteriores['codigos_valores'][presentes], np.array(codigos_novos, dtype=np.int64)])
+    return {
+        'valores': valores,
+        'normalizados': np.asarray(anteriores['normalizados'], dtype=object)[presentes].tolist() + normalizados_novos,
+        'frequencias': np.concatenate([frequencias.to_numpy()[presentes], np.array(frequencias_novas, dtype=np.int64)]),
+        'codigos': codigos,
+        'codigos_valores': codigos_valores,
+        'chaves': chaves,
+        'posicao_chave': posicao_chave,
+        'codigo_valor': codigo_valor if presentes.all() and not valores_novos else dict(zip(valores, codigos_valores.tolist())),
+    }
+
+# Função para obter o motor de cálculo escolhido na sessão
+def motor_atual():
+    """Motor de consulta (pandas, pyarrow ou polars) escolhido nas configurações; todos dão o mesmo resultado"""
+    return obter_motor(st.session_state.get('motor_calculo', 'pandas'))
+
+# Função para montar o cubo base de agregação
+@st.cache_resource(show_spinner=False, max_entries=32)
+def montar_cubo_base(_df, chave_dataset, dimensoes, colunas_metricas):
+    """Agrega o dataset inteiro uma vez por conjunto de dimensões: registros, soma e nº de valores por métrica"""
+    return motor_atual().agrupar(_df, dimensoes, colunas_metricas)
+
+# Função para agregar os resultados filtrados
+@st.cache_data(show_spinner=False, max_entries=64)
+def agregar_resultados(_df, _df_filtrado, _filtros_aplicados, chave_dataset, impressao_filtros,
+                       colunas_grupo, colunas_metricas, operacoes, restricoes_extras=()):
+    """Agrupa os resultados filtrados, derivando do cubo base sempre que possível
+    
+    O cubo usa como dimensões as colunas de agrupamento mais as colunas com filtro de valores;
+    filtros de faixa em colunas fora do agrupamento exigem reagrupar as linhas filtradas, assim
+    como restrições que não são filtros de coluna (ex.: remoção de duplicatas), que entram na chave do cache.
+    """
+    colunas_grupo = list(colunas_grupo)
+    usar_cubo = not restricoes_extras and all(
+        isinstance(filtro, list) or (coluna in colunas_grupo and np.issubdtype(_df[coluna].dtype, np.number))
+        for coluna, filtro in _filtros_aplicados.items()
+    )
+    
+    if usar_cubo:
+        dimensoes = tuple(colunas_grupo + sorted(c for c in _filtros_aplicados if c not in colunas_grupo))
+        cubo = montar_cubo_base(_df, chave_dataset, dimensoes, colunas_metricas)
+        mascara = np.ones(len(cubo), dtype=bool)
+        for coluna, filtro in _filtros_aplicados.items():
+            if isinstance(filtro, list) and cubo[coluna].dtype == 'object':
+                chaves = {normalizar_texto(str(x)) for x in filtro}
+                mascara &= cubo[coluna].astype(str).map(normalizar_texto).isin(chaves).to_numpy()
+            elif isinstance(filtro, list):
+                mascara &= cubo[coluna].isin(filtro).to_numpy()
+            else:
+                mascara &= ((cubo[coluna] >= filtro[0]) & (cubo[coluna] <= filtro[1])).to_numpy()
+        resultado = cubo[mascara].groupby(colunas_grupo, dropna=False, sort=False).sum(numeric_only=True)
+        resultado = resultado[[c for c in cubo.columns if c not in dimensoes]]
+    else:
+        resultado = motor_atual().agrupar(_df_filtrado, colunas_grupo, colunas_metricas).set_index(colunas_grupo)
+    
+    # Montar as métricas pedidas a partir de registros/soma/n
+    saida = pd.DataFrame(index=resultado.index)
+    if 'Contagem' in operacoes:
+        saida['Registros'] = resultado['Registros']
+    for metrica in colunas_metricas:
+        if 'Soma' in operacoes:
+            saida[f"{metrica} - soma"] = resultado[f"{metrica} - soma"]
+        if 'Média' in operacoes:
+            saida[f"{metrica} - média"] = resultado[f"{metrica} - soma"] / resultado[f"{metrica} - n"].replace(0, np.nan)
+    saida = saida[resultado['Registros'] > 0]
+    return saida.sort_values(list(saida.columns[:1]), ascending=False).reset_index()
+
+# Função para exportar o resultado de uma consulta em Parquet
+@st.cache_resource(show_spinner=False, max_entries=8)
+def exportar_parquet_consulta(_df_filtrado, chave_dataset, impressao_filtros, restricoes_extras):
+    return motor_atual().exportar_parquet(_df_filtrado)
+
+# Função para montar os metadados da consulta (aba Metadados do Excel e cabeçalho do PDF)
+def montar_metadados_consulta(total_registros, registros_filtrados, filtros_aplicados, nome_arquivo, consulta_avancada=''):
+    filtros_texto = []
+    for coluna, filtro in filtros_aplicados.items():
+        if isinstance(filtro, list):
+            filtros_texto.append(f"{coluna}: {', '.join(map(str, filtro))}")
+        else:
+            filtros_texto.append(f"{coluna}: {filtro[0]} a {filtro[1]}")
+    if consulta_avancada:
+        filtros_texto.append(f"Expressão: {consulta_avancada}")
+    
+    return pd.DataFrame({
+        'Parâmetro': [
+            'Data da consulta', 
+            'Total de registros', 
+            'Registros filtrados',
+            'Filtros aplicados', 
+            'Arquivo original',
+            'Detalhes dos Filtros'
+        ],
+        'Valor': [
+            datetime.now().strftime('%d/%m/%Y %H:%M'),
+            total_registros,
+            registros_filtrados,
+            len(filtros_aplicados),
+            nome_arquivo,
+            '; '.join(filtros_texto) if filtros_texto else 'Nenhum'
+        ]
+    })
+
+# Função para gerar o relatório PDF da consulta
+@st.cache_resource(show_spinner=False, max_entries=8)
+def gerar_pdf_consulta(_df_filtrado, _metadados, chave_dataset, impressao_filtros, restricoes_extras,
+                       colunas_filtradas, colunas_tabela, linhas_por_bloco=2000):
+    """Desenha o relatório direto no canvas do reportlab, página a página: metadados, valores mais
+    frequentes das colunas filtradas e a tabela de resultados
+    
+    A tabela é convertida para texto em blocos de linhas, então a memória de trabalho não depende
+    do tamanho do resultado e o tempo cresce linearmente com as linhas. O relatório fica em cache,
+    então os metadados não levam a data da consulta (ela vai no nome do arquivo baixado).
+    """
+    largura, altura = landscape(A4)
+    margem = 36
+    estado = {'y': altura - margem, 'pagina': 1}
+    
+    with io.BytesIO() as saida:
+        pdf = canvas.Canvas(saida, pagesize=(largura, altura), pageCompression=1)
+        pdf.setTitle("Relatório da Consulta")
+        
+        def nova_pagina():
+            pdf.setFont("Helvetica", 7)
+            pdf.drawRightString(largura - margem, margem / 2, f"Página {estado['pagina']}")
+            pdf.showPage()
+            estado['pagina'] += 1
+            estado['y'] = altura - margem
+        
+        def escrever(texto, tamanho=9, negrito=False, recuo=0):
+            if estado['y'] < margem + tamanho:
+                nova_pagina()
+            pdf.setFont("Helvetica-Bold" if negrito else "Helvetica", tamanho)
+            limite = int((largura - 2 * margem - recuo) / (tamanho * 0.5))
+            pdf.drawString(margem + recuo, estado['y'], texto if len(texto) <= limite else texto[:limite - 1] + "…")
+            estado['y'] -= tamanho * 1.5
+        
+        # Metadados (os mesmos da aba Metadados do Excel, menos a data da consulta)
+        escrever("Relatório da Consulta", tamanho=16, negrito=True)
+        for parametro, valor in zip(_metadados['Parâmetro'], _metadados['Valor']):
+            if parametro != 'Data da consulta':
+                escrever(f"{parametro}: {valor}")
+        
+        # Valores mais frequentes de cada coluna filtrada
+        if colunas_filtradas:
+            estado['y'] -= 6
+            escrever("Valores mais frequentes nas colunas filtradas", tamanho=12, negrito=True)
+            for coluna in colunas_filtradas:
+                contagem = motor_atual().mais_frequentes(_df_filtrado[coluna], 5)
+                escrever(str(coluna), negrito=True, recuo=8)
+                for valor, quantidade in contagem.items():
+                    escrever(f"{valor}: {quantidade} registro(s) ({quantidade / len(_df_filtrado):.1%})", recuo=20)
+        
+        # Tabela de resultados, com cabeçalho repetido em cada página
+        estado['y'] -= 6
+        escrever(f"Resultados ({len(_df_filtrado)} registros)", tamanho=12, negrito=True)
+        colunas = ['Linha Excel'] + [str(c) for c in colunas_tabela]
+        tamanho = 7
+        largura_coluna = (largura - 2 * margem) / len(colunas)
+        limite = max(int(largura_coluna / (tamanho * 0.5)) - 1, 3)
+        
+        def cabecalho():
+            pdf.setFont("Helvetica-Bold", tamanho)
+            for i, nome in enumerate(colunas):
+                pdf.drawString(margem + i * largura_coluna, estado['y'], nome[:limite])
+            pdf.line(margem, estado['y'] - 2, largura - margem, estado['y'] - 2)
+            estado['y'] -= tamanho * 1.6
+            # As células da página vão num único objeto de texto (bem mais rápido que um drawString por célula)
+            texto_pagina = pdf.beginText()
+            texto_pagina.setFont("Helvetica", tamanho)
+            return texto_pagina
+        
+        texto_pagina = cabecalho()
+        for inicio in range(0, len(_df_filtrado), linhas_por_bloco):
+            bloco = _df_filtrado.iloc[inicio:inicio + linhas_por_bloco][list(colunas_tabela)]
+            textos = bloco.astype(object).where(bloco.notna(), '').astype(str).to_numpy()
+            for linha_excel, valores in zip(bloco.index + 2, textos):
+                if estado['y'] < margem:
+                    pdf.drawText(texto_pagina)
+                    nova_pagina()
+                    texto_pagina = cabecalho()
+                for i, texto in enumerate((str(linha_excel),) + tuple(valores)):
+                    texto_pagina.setTextOrigin(margem + i * largura_coluna, estado['y'])
+                    texto_pagina.textOut(texto if len(texto) <= limite else texto[:limite - 1] + "…")
+                estado['y'] -= tamanho * 1.4
+        pdf.drawText(texto_pagina)
+        
+        nova_pagina()
+        pdf.save()
+        return saida.getvalue()
+
+# Callback do botão que pede o relatório PDF
+def solicitar_relatorio_pdf(chave_relatorio):
+    st.session_state['relatorio_pdf'] = chave_relatorio
+
+# Função para obter as linhas de uma consulta (cache compartilhado entre sessões)
+@st.cache_resource(show_spinner=False, max_entries=64)
+def resultado_consulta(_df, _filtros_aplicados, _mascaras_prontas, chave_dataset, chave_consulta):
+    """Posições das linhas que passam em todos os filtros, guardadas pela chave canônica da consulta
+    
+    Quem abre um link compartilhado da mesma consulta recebe o resultado já calculado.
+    """
+    mascara_total = np.ones(len(_df), dtype=bool)
+    for coluna, filtro in _filtros_aplicados.items():
+        if coluna in _mascaras_prontas:
+            mascara_total &= _mascaras_prontas[coluna]
+        else:
+            mascara_total &= calcular_mascara_filtro(_df, coluna, filtro, chave_dataset)
+    return np.flatnonzero(mascara_total)
+
+# Função para identificar respondentes duplicados
+@st.cache_resource(show_spinner=False, max_entries=16)
+def identificar_duplicatas(_df, chave_dataset, colunas_chave):
+    """Hash por linha das colunas-chave normalizadas (acentos/maiúsculas colidem), em uma só passada
+    
+    Cada linha recebe o grupo do seu hash; a primeira ocorrência fica como original e as demais
+    como duplicatas. Sem comparação entre pares, o custo cresce linearmente com as linhas.
+    Linhas com alguma coluna-chave vazia não identificam o respondente: ficam em grupos só delas
+    e nunca são marcadas como duplicatas.
+    """
+    codigos = pd.DataFrame({
+        i: contar_valores_coluna(_df[coluna], chave_dataset, coluna)['codigos']
+        for i, coluna in enumerate(colunas_chave)
+    })
+    completas = (codigos.to_numpy() >= 0).all(axis=1) & _df[list(colunas_chave)].notna().all(axis=1).to_numpy()
+    hashes = pd.util.hash_pandas_object(codigos[completas], index=False).to_numpy()
+    grupos = np.empty(len(codigos), dtype=np.int64)
+    grupos[completas], _ = pd.factorize(hashes)
+    grupos[~completas] = grupos[completas].max(initial=-1) + 1 + np.arange(np.count_nonzero(~completas))
+    tamanhos = np.bincount(grupos, minlength=len(codigos) and int(grupos.max()) + 1)
+    duplicada = np.zeros(len(codigos), dtype=bool)
+    duplicada[completas] = pd.Series(hashes).duplicated(keep='first').to_numpy()
+    return {
+        'duplicada': duplicada,
+        'grupos': grupos,
+        'tamanhos': tamanhos,
+        'repetida': tamanhos[grupos] > 1,
+    }
+
+# Função para restaurar a consulta a partir dos parâmetros da URL
+def restaurar_consulta_url(df, chave_dataset):
+    """Na primeira execução da sessão com este dataset, copia colunas, filtros e página da URL
+    para o estado inicial dos widgets
+    
+    Só o primeiro dataset da sessão usa o link aberto; depois, a URL guarda a consulta que a própria
+    sessão gravou para a planilha anterior, e esses parâmetros são descartados sem aviso.
+    """
+    if st.session_state.get('consulta_restaurada') == chave_dataset:
+        return
+    primeiro_dataset = 'consulta_restaurada' not in st.session_state
+    st.session_state['consulta_restaurada'] = chave_dataset
+    
+    parametros = st.experimental_get_query_params()
+    if 'ds' not in parametros:
+        return
+    gravados_pela_sessao = {chave: valores[0] for chave, valores in parametros.items()} == st.session_state.get('consulta_gravada')
+    if not primeiro_dataset or gravados_pela_sessao:
+        st.experimental_set_query_params()
+        return
+    if parametros['ds'][0] != chave_dataset[:12]:
+        st.warning("🔗 O link aberto é de outra planilha; a consulta compartilhada não foi aplicada.")
+        return
+    
+    def ler_indices(nome):
+        valores = parametros.get(nome, [''])[0].split(',')
+        return [int(v) - 1 for v in valores if v.isdigit() and 1 <= int(v) <= len(df.columns)]
+    
+    colunas_filtro_idx = ler_indices('fc')
+    if 'cx' in parametros:
+        st.session_state['selecao_colunas_exibicao'] = ler_indices('cx')
+    if parametros.get('q', [''])[0]:
+        st.session_state['consulta_avancada'] = parametros['q'][0]
+    if parametros.get('p', [''])[0].isdigit():
+        st.session_state['inicial_pagina'] = int(parametros['p'][0])
+    
+    try:
+        filtros = json.loads(parametros.get('f', ['{}'])[0])
+    except ValueError:
+        filtros = {}
+    colunas_por_nome = {str(coluna): i for i, coluna in enumerate(df.columns)}
+    for nome_coluna, valor in filtros.items():
+        if nome_coluna not in colunas_por_nome:
+            continue
+        idx = colunas_por_nome[nome_coluna]
+        coluna = df.columns[idx]
+        tipo = tipo_filtro_coluna(df, coluna, chave_dataset)
+        try:
+            if tipo == 'texto':
+                codigo_valor = contar_valores_coluna(df[coluna], chave_dataset, coluna)['codigo_valor']
+                st.session_state[f"selecao_{coluna}"] = [str(v) for v in valor if str(v) in codigo_valor]
+            elif tipo == 'categorico':
+                valores_por_texto = {str(v): v for v in df[coluna].dropna().unique()}
+                st.session_state[f"selecao_{coluna}"] = [valores_por_texto[str(v)] for v in valor if str(v) in valores_por_texto]
+            elif tipo == 'numerico':
+                st.session_state[f"inicial_faixa_{coluna}"] = (float(valor[0]), float(valor[1]))
+            elif tipo == 'data':
+                st.session_state[f"inicial_datas_{coluna}"] = (date.fromisoformat(valor[0]), date.fromisoformat(valor[1]))
+            else:
+                continue
+        except (TypeError, ValueError, IndexError):
+            continue
+        if idx not in colunas_filtro_idx:
+            colunas_filtro_idx.append(idx)
+    
+    if colunas_filtro_idx:
+        st.session_state['selecao_colunas_filtro'] = colunas_filtro_idx[:6]
+
+# Função para gravar a consulta atual nos parâmetros da URL
+def serializar_consulta_url(chave_dataset, colunas_filtro_idx, filtros_aplicados, colunas_exibicao_idx, pagina,
+                            consulta_avancada=''):
+    """Filtros, colunas e página viram parâmetros da URL, para compartilhar a consulta por link"""
+    filtros = {}
+    for coluna, filtro in filtros_aplicados.items():
+        if isinstance(filtro, list):
+            filtros[str(coluna)] = [str(v) for v in filtro]
+        elif isinstance(filtro[0], date):
+            filtros[str(coluna)] = [filtro[0].isoformat(), filtro[1].isoformat()]
+        else:
+            filtros[str(coluna)] = [float(filtro[0]), float(filtro[1])]
+    
+    parametros = {
+        'ds': chave_dataset[:12],
+        'fc': ",".join(str(i + 1) for i in colunas_filtro_idx),
+        'cx': ",".join(str(i + 1) for i in colunas_exibicao_idx),
+        'p': str(pagina),
+    }
+    if filtros:
+        parametros['f'] = json.dumps(filtros, ensure_ascii=False, separators=(',', ':'))
+    if consulta_avancada:
+        parametros['q'] = consulta_avancada
+    
+    atuais = {chave: valores[0] for chave, valores in st.experimental_get_query_params().items()}
+    if atuais != parametros:
+        st.experimental_set_query_params(**parametros)
+    st.session_state['consulta_gravada'] = parametros
+
+# Callback do botão "Limpar Filtros": apaga o estado de todos os filtros
+def limpar_filtros():
+    prefixos = ('selecao_', 'multiselect_', 'faixa_', 'datas_', 'busca_', 'sugestoes_', 'inicial_')
+    for chave in list(st.session_state.keys()):
+        if chave.startswith(prefixos):
+            del st.session_state[chave]
+    st.session_state.pop('consulta_avancada', None)
+
+# Função para detectar e converter as colunas de data
+@st.cache_resource(show_spinner=False, max_entries=8)
+def detectar_colunas_data(_df, chave_dataset, tamanho_amostra=200, proporcao_minima=0.9):
+    """Retorna {coluna: datas (datetime64)} para colunas de data nativas ou textos em formato de data
+    
+    O formato é escolhido numa amostra e a coluna inteira é convertida de uma vez; o DataFrame não é alterado.
+    """
+    colunas_data = {}
+    for coluna in _df.columns:
+        dados = _df[coluna]
+        if pd.api.types.is_datetime64_any_dtype(dados):
+            colunas_data[coluna] = dados
+            continue
+        if dados.dtype != 'object':
+            continue
+        
+        texto = dados.astype(str).str.strip()
+        amostra = texto[texto != ''].head(tamanho_amostra)
+        if len(amostra) == 0:
+            continue
+        for formato in FORMATOS_DATA:
+            if pd.to_datetime(amostra, format=formato, errors='coerce').notna().mean() >= proporcao_minima:
+                colunas_data[coluna] = pd.to_datetime(texto, format=formato, errors='coerce')
+                break
+    return colunas_data
+
+# Função para indexar a ordem dos valores de uma coluna
+@st.cache_resource(show_spinner=False, max_entries=256)
+def indexar_ordenacao(_valores, chave_dataset, coluna):
+    """Ordem de classificação dos valores não nulos, para responder filtros de faixa com searchsorted
+    
+    Numa nova versão do dataset, só as linhas novas/alteradas são ordenadas e intercaladas na ordem anterior.
+    """
+    valores = np.asarray(_valores)
+    versao_base = obter_versao_base(chave_dataset)
+    if versao_base is not None:
+        df_base, chave_base, origem = versao_base
+        if coluna in df_base.columns:
+            valores_base = detectar_colunas_data(df_base, chave_base).get(coluna, df_base[coluna])
+            if np.asarray(valores_base).dtype == valores.dtype:
+                anterior = indexar_ordenacao(valores_base, chave_base, coluna)
+                return intercalar_ordenacao(anterior, valores, origem)
+    
+    validos = np.flatnonzero(~pd.isna(valores))
+    ordem = validos[np.argsort(valores[validos], kind='stable')]
+    return {'ordem': ordem, 'ordenados': valores[ordem], 'total': len(valores)}
+
+# Função para atualizar um índice ordenado a partir da versão anterior
+def intercalar_ordenacao(anterior, valores, origem):
+    """Mantém a ordem das linhas iguais, ordena só as novas e as insere com searchsorted"""
+    posicao_nova = np.full(anterior['total'], -1, dtype=np.int64)
+    reaproveitadas = np.flatnonzero(origem >= 0)
+    posicao_nova[origem[reaproveitadas]] = reaproveitadas
+    mantidas = posicao_nova[anterior['ordem']]
+    mantidas = mantidas[mantidas >= 0]
+    
+    novas = np.flatnonzero(origem < 0)
+    novas = novas[~pd.isna(valores[novas])]
+    novas = novas[np.argsort(valores[novas], kind='stable')]
+    ordem = np.insert(mantidas, np.searchsorted(valores[mantidas], valores[novas], side='right'), novas)
+    return {'ordem': ordem, 'ordenados': valores[ordem], 'total': len(valores)}
+
+# Função para calcular a máscara de uma faixa usando o índice ordenado
+def mascara_faixa_ordenada(indice, inicio, fim):
+    """Localiza a faixa [inicio, fim] por busca binária e marca só as linhas dentro dela"""
+    posicao_inicio = np.searchsorted(indice['ordenados'], inicio, side='left')
+    posicao_fim = np.searchsorted(indice['ordenados'], fim, side='right')
+    mascara = np.zeros(indice['total'], dtype=bool)
+    mascara[indice['ordem'][posicao_inicio:posicao_fim]] = True
+    return mascara
+
+# Função para converter um período (datas do widget) em limites datetime64
+def limites_periodo(periodo):
+    inicio = pd.Timestamp(periodo[0]).to_datetime64()
+    fim = (pd.Timestamp(periodo[1]) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')).to_datetime64()
+    return inicio, fim
+
+# Função para identificar o tipo de filtro de uma coluna
+def tipo_filtro_coluna(df, coluna, chave_dataset):
+    """Retorna 'data', 'texto', 'numerico', 'categorico' ou None, na mesma ordem de decisão da barra lateral"""
+    colunas_data = detectar_colunas_data(df, chave_dataset)
+    if coluna in colunas_data:
+        return 'data' if colunas_data[coluna].notna().any() else None
+    if len(df[coluna].dropna()) == 0:
+        return None
+    if df[coluna].dtype in ['object', 'string']:
+        return 'texto'
+    if np.issubdtype(df[coluna].dtype, np.number):
+        return 'numerico'
+    if df[coluna].nunique() <= 10:
+        return 'categorico'
+    return None
+
+# Função para prever o filtro que o widget da coluna devolverá nesta execução
+def prever_filtro(df, coluna, chave_dataset):
+    """Lê o estado dos widgets antes de desenhá-los, para as contagens por faceta"""
+    tipo = tipo_filtro_coluna(df, coluna, chave_dataset)
+    if tipo == 'data':
+        periodo = st.session_state.get(f"datas_{coluna}", st.session_state.get(f"inicial_datas_{coluna}"))
+        if periodo is None or len(periodo) != 2:
+            return None
+        ordenados = indexar_ordenacao(detectar_colunas_data(df, chave_dataset)[coluna], chave_dataset, coluna)['ordenados']
+        periodo_completo = (pd.Timestamp(ordenados[0]).date(), pd.Timestamp(ordenados[-1]).date())
+        return tuple(periodo) if tuple(periodo) != periodo_completo else None
+    if tipo == 'texto':
+        selecao = st.session_state.get(f"multiselect_{coluna}", st.session_state.get(f"selecao_{coluna}", []))
+        return list(selecao) or None
+    if tipo == 'categorico':
+        selecao = st.session_state.get(f"multiselect_small_{coluna}", st.session_state.get(f"selecao_{coluna}", []))
+        return list(selecao) or None
+    if tipo == 'numerico':
+        faixa = st.session_state.get(f"faixa_{coluna}", st.session_state.get(f"inicial_faixa_{coluna}"))
+        if faixa is None:
+            ordenados = indexar_ordenacao(df[coluna], chave_dataset, coluna)['ordenados']
+            min_val = float(ordenados[0])
+            max_val = float(ordenados[-1])
+            faixa = (min_val, max_val) if min_val != max_val else None
+        return tuple(faixa) if faixa is not None else None
+    return None
+
+# Função para calcular a máscara de linhas de um filtro
+def calcular_mascara_filtro(df, coluna, filtro, chave_dataset):
+    """Máscara booleana vetorizada (sobre os códigos normalizados, no caso de texto)"""
+    if isinstance(filtro, list):  # Filtro de múltiplos valores
+        if df[coluna].dtype in ['object', 'string']:
+            indice = contar_valores_coluna(df[coluna], chave_dataset, coluna)
+            chaves_selecionadas = {normalizar_texto(str(x)) for x in filtro}
+            codigos = [indice['posicao_chave'][chave] for chave in chaves_selecionadas if chave in indice['posicao_chave']]
+            return motor_atual().mascara_codigos(indice['codigos'], codigos)
+        return motor_atual().mascara_valores(df[coluna], filtro)
+    # Filtro de período (datas)
+    if isinstance(filtro[0], date):
+        datas = detectar_colunas_data(df, chave_dataset)[coluna]
+        return mascara_faixa_ordenada(indexar_ordenacao(datas, chave_dataset, coluna), *limites_periodo(filtro))
+    # Filtro de faixa numérica
+    return mascara_faixa_ordenada(indexar_ordenacao(df[coluna], chave_dataset, coluna), filtro[0], filtro[1])
+
+# Palavras da consulta avançada (aceitas em português ou inglês)
+PALAVRAS_CONSULTA = {
+    'e': 'e', 'and': 'e',
+    'ou': 'ou', 'or': 'ou',
+    'não': 'nao', 'nao': 'nao', 'not': 'nao',
+    'em': 'em', 'in': 'em',
+    'entre': 'entre', 'between': 'entre',
+    'contém': 'contem', 'contem': 'contem', 'contains': 'contem',
+}
+
+TOKENS_CONSULTA = re.compile(r"""\s*(?:
+      (?P<coluna>`[^`]*`)
+    | (?P<texto>"[^"]*"|'[^']*')
+    | (?P<data>\d{1,2}/\d{1,2}/\d{4})
+    | (?P<numero>-?\d+(?:\.\d+)?(?![^\s(),=<>!]))
+    | (?P<simbolo>>=|<=|!=|<>|=|>|<|\(|\)|,)
+    | (?P<palavra>[^\s`"'(),=<>!]+)
+    )""", re.VERBOSE)
+
+class AnalisadorConsulta:
+    """Analisador descendente recursivo da consulta avançada
+    
+    Gramática (palavras em português ou inglês):
+        expressao  := termo ('ou' termo)*
+        termo      := fator ('e' fator)*
+        fator      := 'não' fator | '(' expressao ')' | comparacao
+        comparacao := coluna ('em' | 'não em') '(' valor (',' valor)* ')'
+                    | coluna 'entre' valor 'e' valor
+                    | coluna ['não'] 'contém' valor
+                    | coluna ('=' | '!=' | '>' | '>=' | '<' | '<=') valor
+    Colunas com espaços vão entre crases (`Nome da coluna`). Os nós resultantes são tuplas
+    canônicas (E/OU achatados e ordenados), usadas também como chave do cache das máscaras.
+    """
+    
+    def __init__(self, texto, colunas):
+        self.tokens = []
+        posicao = 0
+        texto = texto.strip()
+        while posicao < len(texto):
+            encontrado = TOKENS_CONSULTA.match(texto, posicao)
+            if not encontrado or encontrado.end() == posicao:
+                raise ValueError(f"Não entendi o trecho \"{texto[posicao:posicao + 15]}\"")
+            self.tokens.append((encontrado.lastgroup, encontrado.group(encontrado.lastgroup)))
+            posicao = encontrado.end()
+            while posicao < len(texto) and texto[posicao].isspace():
+                posicao += 1
+        self.posicao = 0
+        self.colunas = {str(coluna): coluna for coluna in colunas}
+        self.colunas_normalizadas = {normalizar_texto(str(coluna)): coluna for coluna in colunas}
+    
+    def analisar(self):
+        if not self.tokens:
+            return None
+        no = self.expressao()
+        if self.posicao < len(self.tokens):
+            raise ValueError(f"Sobrou \"{self.tokens[self.posicao][1]}\" no fim da expressão")
+        return no
+    
+    # Auxiliares de leitura dos tokens
+    def olhar(self, deslocamento=0):
+        indice = self.posicao + deslocamento
+        return self.tokens[indice] if indice < len(self.tokens) else (None, None)
+    
+    def palavra(self, deslocamento=0):
+        tipo, valor = self.olhar(deslocamento)
+        return PALAVRAS_CONSULTA.get(valor.lower()) if tipo == 'palavra' else None
+    
+    def consumir(self, simbolo=None, palavra=None):
+        tipo, valor = self.olhar()
+        if tipo is None:
+            raise ValueError("A expressão terminou antes do esperado")
+        if simbolo is not None and (tipo != 'simbolo' or valor != simbolo):
+            raise ValueError(f"Esperava \"{simbolo}\" e encontrei \"{valor}\"")
+        if palavra is not None and self.palavra() != palavra:
+            raise ValueError(f"Esperava \"{palavra}\" e encontrei \"{valor}\"")
+        self.posicao += 1
+        return tipo, valor
+    
+    # Regras da gramática
+    def expressao(self):
+        partes = [self.termo()]
+        while self.palavra() == 'ou':
+            self.consumir()
+            partes.append(self.termo())
+        return self.combinar('ou', partes)
+    
+    def termo(self):
+        partes = [self.fator()]
+        while self.palavra() == 'e':
+            self.consumir()
+            partes.append(self.fator())
+        return self.combinar('e', partes)
+    
+    def fator(self):
+        if self.palavra() == 'nao':
+            self.consumir()
+            return self.negar(self.fator())
+        if self.olhar() == ('simbolo', '('):
+            self.consumir('(')
+            no = self.expressao()
+            self.consumir(')')
+            return no
+        return self.comparacao()
+    
+    def comparacao(self):
+        coluna = self.coluna()
+        negar = False
+        if self.palavra() == 'nao' and self.palavra(1) in ('em', 'contem'):
+            self.consumir()
+            negar = True
+        operador = self.palavra()
+        tipo, simbolo = self.olhar()
+        if operador == 'em':
+            self.consumir()
+            self.consumir('(')
+            valores = [self.valor()]
+            while self.olhar() == ('simbolo', ','):
+                self.consumir(',')
+                valores.append(self.valor())
+            self.consumir(')')
+            no = ('em', coluna, tuple(sorted(set(valores), key=repr)))
+        elif operador == 'entre':
+            self.consumir()
+            inicio = self.valor()
+            self.consumir(palavra='e')
+            no = ('entre', coluna, inicio, self.valor())
+        elif operador == 'contem':
+            self.consumir()
+            no = ('contem', coluna, normalizar_texto(str(self.valor())))
+        elif tipo == 'simbolo' and simbolo in ('=', '!=', '<>', '>', '>=', '<', '<='):
+            self.consumir()
+            valor = self.valor()
+            if simbolo == '=':
+                no = ('em', coluna, (valor,))
+            elif simbolo in ('!=', '<>'):
+                no, negar = ('em', coluna, (valor,)), True
+            else:
+                no = ('compara', coluna, simbolo, valor)
+        else:
+            raise ValueError(f"Depois da coluna \"{coluna}\" esperava em, entre, contém ou um comparador (=, >, <...)")
+        return self.negar(no) if negar else no
+    
+    def coluna(self):
+        tipo, valor = self.consumir()
+        if tipo not in ('coluna', 'palavra', 'texto'):
+            raise ValueError(f"Esperava o nome de uma coluna e encontrei \"{valor}\"")
+        nome = valor[1:-1] if tipo in ('coluna', 'texto') else valor
+        if nome in self.colunas:
+            return self.colunas[nome]
+        if normalizar_texto(nome) in self.colunas_normalizadas:
+            return self.colunas_normalizadas[normalizar_texto(nome)]
+        raise ValueError(f"Coluna \"{nome}\" não encontrada (use crases para nomes com espaços: `{nome}`)")
+    
+    def valor(self):
+        # Números ficam com o texto digitado (012, 1234567): as colunas numéricas convertem na
+        # comparação e as de texto comparam com o que foi escrito
+        tipo, valor = self.consumir()
+        if tipo == 'texto':
+            return valor[1:-1]
+        if tipo == 'data':
+            return datetime.strptime(valor, '%d/%m/%Y').date()
+        if tipo in ('numero', 'palavra'):
+            return valor
+        raise ValueError(f"Esperava um valor e encontrei \"{valor}\"")
+    
+    # Forma canônica dos nós (a mesma subexpressão sempre gera a mesma tupla)
+    @staticmethod
+    def combinar(operador, partes):
+        if len(partes) == 1:
+            return partes[0]
+        achatadas = set()
+        for parte in partes:
+            achatadas.update(parte[1:] if parte[0] == operador else (parte,))
+        return (operador,) + tuple(sorted(achatadas, key=repr))
+    
+    @staticmethod
+    def negar(no):
+        return no[1] if no[0] == 'nao' else ('nao', no)
+
+# Função para compilar o texto da consulta avançada
+def compilar_consulta(texto, colunas):
+    """Árvore canônica da expressão (None se vazia); erros de sintaxe viram ValueError com mensagem amigável"""
+    return AnalisadorConsulta(texto, colunas).analisar()
+
+# Função para calcular a máscara de uma comparação da consulta avançada
+def mascara_comparacao(df, no, chave_dataset):
+    operacao, coluna = no[0], no[1]
+    tipo = tipo_filtro_coluna(df, coluna, chave_dataset)
+    
+    # Datas e números: faixas pelo índice ordenado
+    if tipo in ('data', 'numerico') and operacao != 'contem':
+        if tipo == 'data':
+            valores = detectar_colunas_data(df, chave_dataset)[coluna]
+            converter = lambda v: v if isinstance(v, date) else datetime.strptime(str(v), '%d/%m/%Y').date()
+        else:
+            valores = df[coluna]
+            converter = float
+        indice = indexar_ordenacao(valores, chave_dataset, coluna)
+        try:
+            argumentos = [converter(v) for v in {'em': no[2], 'entre': no[2:], 'compara': no[3:]}[operacao]]
+        except (TypeError, ValueError):
+            raise ValueError(f"A coluna \"{coluna}\" é {'de datas (use dd/mm/aaaa)' if tipo == 'data' else 'numérica'}")
+        
+        def faixa(inicio, fim):
+            if tipo == 'data':
+                inicio, fim = limites_periodo((inicio, fim))
+            return mascara_faixa_ordenada(indice, inicio, fim)
+        
+        if operacao == 'em':
+            return np.logical_or.reduce([faixa(v, v) for v in argumentos])
+        if operacao == 'entre':
+            return faixa(min(argumentos), max(argumentos))
+        menor, maior = indice['ordenados'][0], indice['ordenados'][-1]
+        if tipo == 'data':
+            menor, maior = pd.Timestamp(menor).date(), pd.Timestamp(maior).date()
+        valor = argumentos[0]
+        if tipo == 'data':
+            seguinte, anterior = valor + timedelta(days=1), valor - timedelta(days=1)
+        else:
+            seguinte, anterior = np.nextafter(valor, np.inf), np.nextafter(valor, -np.inf)
+        limites = {
+            '>=': (valor, maior),
+            '<=': (menor, valor),
+            '>': (seguinte, maior),
+            '<': (menor, anterior),
+        }[no[2]]
+        if limites[0] > limites[1]:
+            return np.zeros(len(df), dtype=bool)
+        return faixa(*limites)
+    
+    if operacao in ('entre', 'compara'):
+        raise ValueError(f"\"{coluna}\" não é numérica nem de datas; use em, = ou contém")
+    
+    # Texto (e demais tipos): códigos das chaves normalizadas
+    indice = contar_valores_coluna(df[coluna], chave_dataset, coluna)
+    if operacao == 'contem':
+        codigos = np.flatnonzero(pd.Series(indice['chaves'], dtype=object).str.contains(no[2], regex=False).to_numpy())
+    else:
+        chaves = {normalizar_texto(str(v)) for v in no[2]}
+        codigos = [indice['posicao_chave'][chave] for chave in chaves if chave in indice['posicao_chave']]
+    return motor_atual().mascara_codigos(indice['codigos'], codigos)
+
+# Função para calcular a máscara de uma (sub)expressão da consulta avançada
+@st.cache_resource(show_spinner=False, max_entries=256)
+def mascara_consulta(_df, no, chave_dataset):
+    """Máscara em cache por subexpressão canônica: consultas que compartilham partes as reaproveitam
+    entre execuções. A máscara devolvida é compartilhada e não deve ser alterada no lugar."""
+    if no[0] == 'e':
+        return np.logical_and.reduce([mascara_consulta(_df, parte, chave_dataset) for parte in no[1:]])
+    if no[0] == 'ou':
+        return np.logical_or.reduce([mascara_consulta(_df, parte, chave_dataset) for parte in no[1:]])
+    if no[0] == 'nao':
+        return ~mascara_consulta(_df, no[1], chave_dataset)
+    return mascara_comparacao(_df, no, chave_dataset)
+
+# Função para combinar as máscaras dos filtros deixando um de fora
+def combinar_mascaras_exceto(colunas, mascaras, total_linhas):
+    """Para cada coluna, devolve a combinação (AND) das máscaras de TODOS OS OUTROS filtros
+    
+    Usa produtos de prefixo e sufixo, então o custo é linear no número de filtros.
+    """
+    ativas = [coluna for coluna in colunas if coluna in mascaras]
+    prefixos = [np.ones(total_linhas, dtype=bool)]
+    for coluna in ativas:
+        prefixos.append(prefixos[-1] & mascaras[coluna])
+    
+    exceto = {}
+    sufixo = np.ones(total_linhas, dtype=bool)
+    for i in range(len(ativas) - 1, -1, -1):
+        exceto[ativas[i]] = prefixos[i] & sufixo
+        sufixo = sufixo & mascaras[ativas[i]]
+    # Colunas sem filtro ativo enxergam todos os filtros
+    for coluna in colunas:
+        exceto.setdefault(coluna, prefixos[-1])
+    return exceto
+
+# Função para calcular as contagens por faceta de uma coluna textual
+def contar_facetas(indice, mascara_outros):
+    """Conta, por chave normalizada, as linhas que passam nos demais filtros"""
+    return motor_atual().contar_codigos(indice['codigos'], mascara_outros, len(indice['chaves']))
+
+# Função para listar os valores que casam com a busca
+def filtrar_candidatos_similares(valor_busca, contagens):
+    """Varre os valores pré-normalizados e devolve as chaves de ranqueamento dos que casam com a busca"""
     if not valor_busca:
         return []
     
     valor_busca_normalizado = normalizar_texto(valor_busca)
-    similares = []
+    candidatos = []
     
-    for valor in lista_valores:
-        if valor_busca_normalizado in normalizar_texto(valor):
-            similares.append(valor)
-            if len(similares) >= limite:
-                break
+    for valor, normalizado, frequencia in zip(contagens['valores'], contagens['normalizados'], contagens['frequencias']):
+        posicao = normalizado.find(valor_busca_normalizado)
+        if posicao < 0:
+            continue
+        # Qualidade: 0 = igual, 1 = começa com o termo, 2 = contém o termo
+        if normalizado == valor_busca_normalizado:
+            qualidade = 0
+        elif posicao == 0:
+            qualidade = 1
+        else:
+            qualidade = 2
+        candidatos.append((qualidade, -int(frequencia), valor))
     
-    return similares
+    return candidatos
+
+# Memória dos labels de colunas já calculados (preenchida sob demanda)
+@st.cache_resource(show_spinner=False, max_entries=16)
+def obter_rotulos_colunas(chave_dataset, mostrar_numeros_colunas):
+    return {}
+
+# Função para obter o label de uma coluna (calculado só quando a coluna aparece na tela)
+def rotulo_coluna(df, chave_dataset, mostrar_numeros_colunas, idx):
+    rotulos = obter_rotulos_colunas(chave_dataset, mostrar_numeros_colunas)
+    if idx not in rotulos:
+        rotulos[idx] = criar_label_coluna(str(df.columns[idx]), df.iloc[:, idx], mostrar_numeros_colunas, idx)
+    return rotulos[idx]
+
+# Função para indexar os nomes das colunas para a busca rápida
+@st.cache_resource(show_spinner=False, max_entries=8)
+def indexar_colunas(_df, chave_dataset):
+    """Nomes normalizados, índice de palavras, índice de trigramas e amostra de valores de cada coluna"""
+    nomes = [normalizar_texto(str(coluna)) for coluna in _df.columns]
+    amostras = [
+        normalizar_texto(" ".join(map(str, amostrar_valores_coluna(_df.iloc[:, i]))))
+        for i in range(len(nomes))
+    ]
+    palavras = {}
+    trigramas = {}
+    for i, nome in enumerate(nomes):
+        for palavra in set(re.findall(r'\w+', nome)):
+            palavras.setdefault(palavra, set()).add(i)
+        for j in range(len(nome) - 2):
+            trigramas.setdefault(nome[j:j + 3], set()).add(i)
+    return {'nomes': nomes, 'amostras': amostras, 'palavras': palavras, 'trigramas': trigramas}
+
+# Função para montar as opções de um seletor de colunas paginado
+def paginar_colunas(candidatas, selecionadas, pagina, tamanho=TAMANHO_PAGINA_COLUNAS):
+    """Colunas já selecionadas + a página atual das candidatas (só essas ganham label)"""
+    inicio = (pagina - 1) * tamanho
+    return list(selecionadas) + [i for i in candidatas[inicio:inicio + tamanho] if i not in selecionadas]
+
+# Função para buscar valores similares
+def encontrar_valores_similares(candidatos, limite=5):
+    """Retorna os `limite` melhores valores, ordenados por qualidade da busca e frequência"""
+    return [valor for _, _, valor in heapq.nsmallest(limite, candidatos)]
+
+# Função para gerar a impressão digital dos filtros aplicados
+def calcular_impressao_filtros(filtros_aplicados):
+    """Hash estável dos filtros ativos (a ordem de colunas e valores não importa)"""
+    canonico = []
+    for coluna in sorted(filtros_aplicados):
+        filtro = filtros_aplicados[coluna]
+        if isinstance(filtro, list):
+            canonico.append([coluna, 'valores', sorted({normalizar_texto(str(x)) for x in filtro})])
+        else:
+            canonico.append([coluna, 'faixa', [v.isoformat() if isinstance(v, date) else float(v) for v in filtro]])
+    return hashlib.sha1(json.dumps(canonico, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+# Callback do botão "mostrar mais": amplia o top-k sem refazer a varredura
+def mostrar_mais_sugestoes(estado_sugestoes):
+    estado_sugestoes['limite'] += estado_sugestoes['passo']
 
 # Função para buscar colunas por número ou texto
-def buscar_colunas_rapido(termo_busca, colunas_com_labels, mostrar_numeros=True):
-    """Busca colunas por número (ex: '12') ou por texto (ex: 'comunidade')"""
+def buscar_colunas_rapido(termo_busca, indice_colunas, mostrar_numeros=True):
+    """Busca colunas por número (ex: '12') ou por texto (ex: 'comunidade') no índice pré-calculado
+    
+    Retorna os índices das colunas: nome igual ao termo, palavra inteira, parte do nome e,
+    por último, colunas cuja amostra de valores contém o termo.
+    """
+    total = len(indice_colunas['nomes'])
     if not termo_busca:
-        return colunas_com_labels
+        return list(range(total))
     
-    resultados = []
-    termo_busca = termo_busca.strip().lower()
+    termo_busca = termo_busca.strip()
     
-    for coluna, label, idx in colunas_com_labels:
-        # Buscar por número da coluna (ex: "12" encontra "Col.12")
-        if mostrar_numeros and termo_busca.isdigit():
-            numero_coluna = idx + 1
-            if str(numero_coluna) == termo_busca or f"col.{termo_busca.zfill(2)}" in label.lower():
-                resultados.append((coluna, label, idx))
-        
-        # Buscar por texto no nome da coluna
-        elif termo_busca in normalizar_texto(coluna):
-            resultados.append((coluna, label, idx))
-        
-        # Buscar por texto no label completo
-        elif termo_busca in normalizar_texto(label):
-            resultados.append((coluna, label, idx))
+    # Buscar por número da coluna (ex: "12" encontra "Col.12")
+    if mostrar_numeros and termo_busca.isdigit():
+        numero_coluna = int(termo_busca)
+        return [numero_coluna - 1] if 1 <= numero_coluna <= total else []
+    
+    termo_busca = normalizar_texto(termo_busca)
+    nomes = indice_colunas['nomes']
+    
+    # Candidatas pelos trigramas do termo (termos curtos varrem os nomes já normalizados)
+    if len(termo_busca) >= 3:
+        conjuntos = [indice_colunas['trigramas'].get(termo_busca[j:j + 3], set()) for j in range(len(termo_busca) - 2)]
+        candidatas = sorted(set.intersection(*conjuntos))
+    else:
+        candidatas = range(total)
     
-    return resultados
+    # Buscar por texto no nome da coluna
+    no_nome = [i for i in candidatas if termo_busca in nomes[i]]
+    palavra_inteira = indice_colunas['palavras'].get(termo_busca, set())
+    no_nome.sort(key=lambda i: (nomes[i] != termo_busca, i not in palavra_inteira, i))
+    
+    # Buscar por texto na amostra de valores
+    encontradas = set(no_nome)
+    na_amostra = [i for i, amostra in enumerate(indice_colunas['amostras']) if i not in encontradas and termo_busca in amostra]
+    
+    return no_nome + na_amostra
 
 # Guia de instruções
 with st.expander("📚 GUIA DE INSTRUÇÕES - Como usar esta ferramenta", expanded=False):
@@ -104,6 +1454,7 @@ with st.expander("📚 GUIA DE INSTRUÇÕES - Como usar esta ferramenta", expand
         ### **1. 📤 CARREGAR PLANILHA**
         - Faça upload de qualquer arquivo Excel (.xlsx)
         - A planilha será processada automaticamente
+        - Em arquivos grandes, as primeiras linhas aparecem enquanto o restante é carregado
         - Colunas vazias serão removidas
         
         ### **2. 🔍 CONFIGURAR FILTROS**
@@ -111,6 +1462,8 @@ with st.expander("📚 GUIA DE INSTRUÇÕES - Como usar esta ferramenta", expand
         - **Use a busca inteligente**: Digite parte do texto para encontrar valores
         - **Seleção múltipla**: Escolha vários valores para cada filtro
         - **Filtros numéricos**: Use sliders para faixas de valores
+        - **Filtros de data**: Colunas de data ganham um calendário para escolher o período
+        - **Contagens**: O número entre parênteses mostra quantos registros cada valor mantém com os demais filtros
         
         ### **3. 📊 VISUALIZAR RESULTADOS**
         - **Selecione colunas para exibir**: Escolha quais colunas ver na tabela
@@ -218,18 +1571,70 @@ uploaded_file = st.file_uploader("📤 Envie sua planilha Excel", type=["xlsx"])
 
 if uploaded_file:
     try:
-        # Ler o arquivo Excel
-        df = pd.read_excel(uploaded_file)
+        # Ler o arquivo Excel em segundo plano (as primeiras linhas aparecem antes do fim da leitura)
+        chave_dataset = calcular_chave_dataset(uploaded_file)
         
-        # Remover colunas completamente vazias
-        df = df.dropna(axis=1, how='all')
+        # Nova versão da planilha anterior: reaproveitar o processamento das linhas que não mudaram
+        dataset_anterior = st.session_state.get('dataset_anterior')
+        chave_base = None
+        if dataset_anterior and dataset_anterior['chave'] != chave_dataset and st.session_state.get('proxima_versao'):
+            chave_base = dataset_anterior['chave']
         
-        # Preencher NaN com string vazia para colunas de texto
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                df[col] = df[col].fillna('')
+        ingestao = obter_ingestao(chave_dataset)
+        iniciar_ingestao(ingestao, uploaded_file, chave_dataset, chave_base)
+        df = aguardar_ingestao(ingestao)
+        if not dataset_anterior or dataset_anterior['chave'] != chave_dataset:
+            st.session_state['dataset_anterior'] = {'chave': chave_dataset, 'nome': uploaded_file.name}
         
         st.success(f"✅ Planilha carregada com sucesso! {len(df)} registros e {len(df.columns)} colunas encontradas.")
+        st.caption(f"⏱️ Primeiras linhas em {ingestao['tempo_primeira_linha']:.2f}s | "
+                   f"leitura completa em {ingestao['tempo_leitura']:.2f}s | "
+                   f"filtros prontos em {ingestao['tempo_total']:.2f}s"
+                   f"{' (perfil aproximado)' if ingestao['perfil_aproximado'] else ''}")
+        
+        # Colunas de texto convertidas para número na carga
+        celulas_nao_numericas = ingestao['celulas_nao_numericas']
+        textos_originais = ingestao['textos_originais']
+        if celulas_nao_numericas:
+            with st.expander(f"🔢 {len(celulas_nao_numericas)} coluna(s) de texto tratada(s) como numérica(s)", expanded=False):
+                st.caption("Células que não são números ficam vazias nessas colunas (e fora dos filtros de faixa); "
+                           "os textos originais estão abaixo.")
+                for coluna, textos in celulas_nao_numericas.items():
+                    st.write(f"**{coluna}:** {len(textos)} célula(s) não numérica(s)")
+                    if len(textos):
+                        st.dataframe(
+                            pd.DataFrame({'Linha Excel': textos.index + 2, 'Valor original': textos.to_numpy()}).head(200),
+                            use_container_width=True,
+                            hide_index=True
+                        )
+        
+        # Resumo das mudanças em relação à versão anterior
+        versao = ingestao['versao']
+        if versao is not None:
+            if versao['origem'] is None:
+                st.warning("📅 As colunas mudaram em relação à versão anterior; a planilha foi processada do zero.")
+            else:
+                st.info(f"📅 Nova versão: {versao['iguais']} linha(s) iguais | "
+                        f"➕ {len(versao['inseridas'])} inserida(s) | "
+                        f"✏️ {len(versao['alteradas'])} alterada(s) | "
+                        f"➖ {len(versao['removidas'])} removida(s)")
+                if len(versao['inseridas']) or len(versao['alteradas']):
+                    with st.expander("📅 Linhas inseridas e alteradas nesta versão", expanded=False):
+                        posicoes_mudancas = np.union1d(versao['inseridas'], versao['alteradas'])
+                        mudancas = com_textos_originais(df.iloc[posicoes_mudancas[:1000]], textos_originais)
+                        mudancas.insert(0, "Mudança", np.where(np.isin(posicoes_mudancas[:1000], versao['alteradas']), "✏️ alterada", "➕ inserida"))
+                        mudancas.insert(0, "Linha Excel", posicoes_mudancas[:1000] + 2)
+                        st.dataframe(mudancas, use_container_width=True, hide_index=True)
+                        if len(posicoes_mudancas) > 1000:
+                            st.caption(f"Mostrando 1000 de {len(posicoes_mudancas)} linhas")
+        st.checkbox(
+            "📅 O próximo arquivo enviado é uma nova versão desta planilha",
+            help="Compara as linhas com esta versão e atualiza só o que mudou, em vez de processar tudo do zero",
+            key="proxima_versao"
+        )
+        
+        # Consulta compartilhada por link (aplicada uma vez por sessão)
+        restaurar_consulta_url(df, chave_dataset)
         
         # Configuração opcional - mostrar números das colunas
         st.sidebar.header("⚙️ Configurações")
@@ -238,15 +1643,38 @@ if uploaded_file:
             value=True,
             help="Exibe 'Col.01', 'Col.02' ao lado dos nomes das colunas"
         )
+        if len(motores_disponiveis()) > 1:
+            st.sidebar.selectbox(
+                "Motor de cálculo:",
+                options=motores_disponiveis(),
+                format_func=lambda nome: obter_motor(nome).descricao,
+                help="Filtros, contagens, agrupamentos e exportações podem rodar em um motor colunar multithread; "
+                     "o resultado é o mesmo do pandas",
+                key="motor_calculo"
+            )
+        perfil_aproximado = st.sidebar.checkbox(
+            "Perfil aproximado dos valores",
+            value=ingestao['perfil_aproximado'],
+            help="Valores únicos, sugestões e contagens das colunas de texto estimados por esboços de uma amostra das linhas "
+                 "(HyperLogLog e Misra-Gries), com a margem de erro ao lado. A coluna passa a ter o perfil exato "
+                 "quando você busca ou seleciona valores nela, ou pelo botão 🎯.",
+            key="perfil_aproximado"
+        )
+        limite_sugestoes = st.sidebar.number_input(
+            "Sugestões por busca",
+            min_value=1,
+            max_value=100,
+            value=5,
+            help="Quantidade de valores mostrados por vez na busca de valores (os mais frequentes primeiro)"
+        )
         
         # Sidebar para filtros
         st.sidebar.header("🔍 Filtros de Consulta")
         
-        # Criar labels descritivos para todas as colunas
-        colunas_com_labels = []
-        for i, coluna in enumerate(df.columns):
-            label = criar_label_coluna(coluna, df[coluna], mostrar_numeros_colunas, i)
-            colunas_com_labels.append((coluna, label, i))  # Agora inclui o índice
+        # Labels descritivos: calculados sob demanda, só para as colunas exibidas
+        indice_colunas = indexar_colunas(df, chave_dataset)
+        def formatar_coluna(idx):
+            return rotulo_coluna(df, chave_dataset, mostrar_numeros_colunas, idx)
         
         # BUSCA RÁPIDA POR COLUNAS
         st.sidebar.markdown("### 🔎 Busca Rápida de Colunas")
@@ -257,36 +1685,80 @@ if uploaded_file:
         )
         
         # Aplicar busca rápida se houver termo
+        todas_colunas = list(range(len(df.columns)))
         if busca_rapida:
-            colunas_filtradas = buscar_colunas_rapido(busca_rapida, colunas_com_labels, mostrar_numeros_colunas)
+            colunas_filtradas = buscar_colunas_rapido(busca_rapida, indice_colunas, mostrar_numeros_colunas)
             if colunas_filtradas:
                 st.sidebar.success(f"🎯 {len(colunas_filtradas)} coluna(s) encontrada(s)")
                 
-                # Mostrar resultados da busca
+                # Mostrar resultados da busca (só a primeira página ganha label)
                 with st.sidebar.expander("📋 Resultados da Busca", expanded=True):
-                    for coluna, label, idx in colunas_filtradas:
-                        st.write(f"**{label}**")
+                    for idx in colunas_filtradas[:TAMANHO_PAGINA_COLUNAS]:
+                        st.write(f"**{formatar_coluna(idx)}**")
+                    if len(colunas_filtradas) > TAMANHO_PAGINA_COLUNAS:
+                        st.caption(f"... e mais {len(colunas_filtradas) - TAMANHO_PAGINA_COLUNAS} coluna(s)")
             else:
                 st.sidebar.warning("❌ Nenhuma coluna encontrada")
-                colunas_filtradas = colunas_com_labels
+                colunas_filtradas = todas_colunas
         else:
-            colunas_filtradas = colunas_com_labels
+            colunas_filtradas = todas_colunas
+        
+        # Planilhas largas: o seletor mostra uma página de colunas por vez
+        total_paginas_colunas = max(1, (len(colunas_filtradas) - 1) // TAMANHO_PAGINA_COLUNAS + 1)
+        pagina_colunas_filtro = 1
+        if total_paginas_colunas > 1:
+            pagina_colunas_filtro = st.sidebar.number_input(
+                "Página de colunas:",
+                min_value=1,
+                max_value=total_paginas_colunas,
+                value=1,
+                help=f"{len(colunas_filtradas)} colunas em {total_paginas_colunas} páginas de {TAMANHO_PAGINA_COLUNAS}",
+                key="pagina_colunas_filtro"
+            )
         
-        # Selecionar colunas para filtro (usando lista filtrada ou completa)
+        # Selecionar colunas para filtro (a seleção é guardada à parte, pois as opções mudam com a busca/página)
+        selecao_colunas_filtro = st.session_state.get('selecao_colunas_filtro', todas_colunas[:3])
         colunas_filtro_selecionadas = st.sidebar.multiselect(
             "Selecione as colunas para filtrar:",
-            options=[label for _, label, _ in colunas_filtradas],
-            default=[label for _, label, _ in colunas_filtradas[:3]] if len(colunas_filtradas) >= 3 else [label for _, label, _ in colunas_filtradas],
+            options=paginar_colunas(colunas_filtradas, selecao_colunas_filtro, pagina_colunas_filtro),
+            default=selecao_colunas_filtro,
+            format_func=formatar_coluna,
             help="Cada coluna selecionada mostrará um filtro específico abaixo",
-            max_selections=6
+            max_selections=6,
+            key="colunas_filtro"
         )
+        st.session_state['selecao_colunas_filtro'] = colunas_filtro_selecionadas
         
-        # Mapear labels de volta para nomes das colunas
-        label_para_coluna = {label: (coluna, idx) for coluna, label, idx in colunas_com_labels}
-        colunas_filtro = [label_para_coluna[label] for label in colunas_filtro_selecionadas]
+        colunas_filtro = [(df.columns[idx], idx) for idx in colunas_filtro_selecionadas]
         
         filtros_aplicados = {}
         
+        # Contagens por faceta: prever os filtros a partir do estado dos widgets e
+        # combinar, para cada coluna, as máscaras de todos os outros filtros (uma só passada)
+        colunas_filtro_validas = [coluna for coluna, _ in colunas_filtro if coluna in df.columns]
+        filtros_previstos = {}
+        for coluna in colunas_filtro_validas:
+            filtro_previsto = prever_filtro(df, coluna, chave_dataset)
+            if filtro_previsto is not None:
+                filtros_previstos[coluna] = filtro_previsto
+        mascaras_filtros = {
+            coluna: calcular_mascara_filtro(df, coluna, filtro, chave_dataset)
+            for coluna, filtro in filtros_previstos.items()
+        }
+        mascaras_outros = combinar_mascaras_exceto(colunas_filtro_validas, mascaras_filtros, len(df))
+        
+        # Consulta avançada: compilada antes dos widgets para também restringir as contagens por faceta
+        consulta_avancada = st.session_state.get('consulta_avancada', '')
+        arvore_consulta, erro_consulta, mascara_avancada = None, None, None
+        try:
+            arvore_consulta = compilar_consulta(consulta_avancada, df.columns)
+            if arvore_consulta is not None:
+                mascara_avancada = mascara_consulta(df, arvore_consulta, chave_dataset)
+        except ValueError as e:
+            arvore_consulta, erro_consulta = None, str(e)
+        if mascara_avancada is not None:
+            mascaras_outros = {coluna: mascara & mascara_avancada for coluna, mascara in mascaras_outros.items()}
+        
         # Criar filtros dinâmicos para cada coluna selecionada
         for coluna_info in colunas_filtro:
             coluna, idx_coluna = coluna_info
@@ -301,13 +1773,61 @@ if uploaded_file:
                 st.sidebar.markdown(titulo_filtro)
                 
                 # Verificar se a coluna tem dados
-                if len(df[coluna].dropna()) > 0:
+                tipo_filtro = tipo_filtro_coluna(df, coluna, chave_dataset)
+                if tipo_filtro == 'data' or len(df[coluna].dropna()) > 0:
+                    # Para colunas de data - período com calendário
+                    if tipo_filtro == 'data':
+                        ordenados = indexar_ordenacao(detectar_colunas_data(df, chave_dataset)[coluna], chave_dataset, coluna)['ordenados']
+                        data_min = pd.Timestamp(ordenados[0]).date()
+                        data_max = pd.Timestamp(ordenados[-1]).date()
+                        
+                        periodo = st.sidebar.date_input(
+                            f"Período:",
+                            value=st.session_state.get(f"inicial_datas_{coluna}", (data_min, data_max)),
+                            min_value=data_min,
+                            max_value=data_max,
+                            format="DD/MM/YYYY",
+                            help="Selecione a data inicial e a final",
+                            key=f"datas_{coluna}"
+                        )
+                        if isinstance(periodo, (tuple, list)) and len(periodo) == 2 and tuple(periodo) != (data_min, data_max):
+                            filtros_aplicados[coluna] = tuple(periodo)
+                            no_periodo = int(np.count_nonzero(mascaras_outros[coluna] & calcular_mascara_filtro(df, coluna, tuple(periodo), chave_dataset)))
+                            st.sidebar.caption(f"📅 {no_periodo} registro(s) no período")
+                        else:
+                            st.sidebar.caption(f"📅 Datas de {data_min:%d/%m/%Y} a {data_max:%d/%m/%Y} | "
+                                               f"{len(ordenados)} registro(s) com data")
+                    
                     # Para colunas textuais - SEMPRE permitir seleção múltipla
-                    if df[coluna].dtype in ['object', 'string']:
-                        valores_unicos = df[coluna].dropna().unique()
-                        valores_unicos = [str(x) for x in valores_unicos if str(x) not in ['', 'nan', 'NaN']]
+                    elif df[coluna].dtype in ['object', 'string']:
+                        # Perfil aproximado: esboços até a coluna precisar do índice exato (busca ou seleção)
+                        usar_esboco = perfil_aproximado and not (
+                            st.session_state.get(f"busca_{coluna}") or st.session_state.get(f"selecao_{coluna}")
+                            or st.session_state.get(f"exato_{coluna}")
+                        )
+                        if usar_esboco:
+                            esboco = esbocar_coluna(df[coluna], chave_dataset, coluna)
+                            frequentes = esboco.mais_frequentes(OPCOES_PERFIL_APROXIMADO)
+                            valores_unicos = frequentes.index.tolist()
+                        else:
+                            contagens = contar_valores_coluna(df[coluna], chave_dataset, coluna)
+                            valores_unicos = contagens['valores']
                         
-                        if len(valores_unicos) > 0:
+                        # Sem nenhum valor que se destaque, o esboço fica sem lista, mas a busca continua disponível
+                        if (esboco.frequentes.total if usar_esboco else len(valores_unicos)) > 0:
+                            if usar_esboco:
+                                # Contagem mínima garantida (extrapolada da amostra); a real pode ser maior em até erro_contagem
+                                erro_contagem = esboco.erro_contagem
+                                codigo_valor = {valor: i for i, valor in enumerate(valores_unicos)}
+                                contagem_faceta = [
+                                    f"≈{quantidade}–{quantidade + erro_contagem} no total" if erro_contagem
+                                    else f"≈{quantidade} no total" if esboco.amostrado else f"{quantidade} no total"
+                                    for quantidade in frequentes.tolist()
+                                ]
+                            else:
+                                contagem_faceta = contar_facetas(contagens, mascaras_outros[coluna])
+                                codigo_valor = contagens['codigo_valor']
+                            
                             # Sistema de busca + seleção múltipla
                             st.sidebar.write("**🔍 Buscar valores:**")
                             
@@ -323,27 +1843,65 @@ if uploaded_file:
                             valores_disponiveis = sorted(valores_unicos)
                             
                             if busca_texto:
-                                valores_similares = encontrar_valores_similares(busca_texto, valores_unicos)
+                                # Candidatos ficam guardados por termo e planilha: "mostrar mais" só amplia o top-k
+                                estado_sugestoes = st.session_state.get(f"sugestoes_{coluna}")
+                                if (estado_sugestoes is None or estado_sugestoes['termo'] != busca_texto
+                                        or estado_sugestoes['passo'] != limite_sugestoes
+                                        or estado_sugestoes.get('dataset') != chave_dataset):
+                                    estado_sugestoes = {
+                                        'dataset': chave_dataset,
+                                        'termo': busca_texto,
+                                        'candidatos': filtrar_candidatos_similares(busca_texto, contagens),
+                                        'passo': limite_sugestoes,
+                                        'limite': limite_sugestoes,
+                                    }
+                                    st.session_state[f"sugestoes_{coluna}"] = estado_sugestoes
+                                
+                                candidatos = estado_sugestoes['candidatos']
+                                valores_similares = [v for v in encontrar_valores_similares(candidatos, estado_sugestoes['limite'])
+                                                     if v in codigo_valor]
                                 if valores_similares:
-                                    st.sidebar.success(f"🎯 {len(valores_similares)} valor(es) encontrado(s)")
-                                    valores_disponiveis = valores_similares
+                                    st.sidebar.success(f"🎯 {len(valores_similares)} de {len(candidatos)} valor(es) encontrado(s)")
+                                    # Manter os valores já selecionados entre as opções (só os que existem nesta planilha)
+                                    selecionados = [v for v in st.session_state.get(f"selecao_{coluna}", [])
+                                                    if v in codigo_valor and v not in valores_similares]
+                                    valores_disponiveis = selecionados + valores_similares
+                                    
+                                    if len(candidatos) > estado_sugestoes['limite']:
+                                        st.sidebar.button(
+                                            "➕ Mostrar mais",
+                                            key=f"mais_{coluna}",
+                                            on_click=mostrar_mais_sugestoes,
+                                            args=(estado_sugestoes,)
+                                        )
                                 else:
                                     st.sidebar.warning("❌ Nenhum valor encontrado")
-                                    valores_disponiveis = []
+                                    valores_disponiveis = [v for v in st.session_state.get(f"selecao_{coluna}", []) if v in codigo_valor]
                             
-                            # Seleção múltipla sempre disponível
+                            # Seleção múltipla sempre disponível. Os rótulos mudam com as contagens
+                            # (o que recria o widget), então a seleção é guardada à parte e volta como default
+                            selecao_anterior = [v for v in st.session_state.get(f"selecao_{coluna}", []) if v in codigo_valor]
+                            valores_disponiveis = selecao_anterior + [v for v in valores_disponiveis if v not in selecao_anterior]
                             selecao = st.sidebar.multiselect(
                                 f"**Selecione os valores:**",
                                 options=valores_disponiveis,
-                                default=[],
-                                help="💡 **DICA:** Selecione múltiplas variações (com/sem acento, maiúsculas/minúsculas)",
+                                default=selecao_anterior,
+                                format_func=lambda valor: f"{valor} ({contagem_faceta[codigo_valor[valor]]})",
+                                help="💡 **DICA:** Selecione múltiplas variações (com/sem acento, maiúsculas/minúsculas). "
+                                     "O número entre parênteses é quantos registros o valor mantém com os demais filtros.",
                                 key=f"multiselect_{coluna}"
                             )
+                            st.session_state[f"selecao_{coluna}"] = selecao
                             
                             # Sugestões automáticas para valores comuns
                             if not busca_texto and not selecao:
-                                # Mostrar valores mais frequentes como sugestão
-                                valores_frequentes = df[coluna].value_counts().head(3).index.tolist()
+                                # Mostrar valores mais frequentes como sugestão (a partir das contagens pré-calculadas)
+                                if usar_esboco:
+                                    valores_frequentes = valores_unicos[:3]
+                                else:
+                                    frequencias = contagens['frequencias']
+                                    mais_frequentes = heapq.nlargest(3, range(len(frequencias)), key=frequencias.__getitem__)
+                                    valores_frequentes = [contagens['valores'][i] for i in mais_frequentes]
                                 if valores_frequentes:
                                     st.sidebar.caption(f"💡 Sugestões: {', '.join(map(str, valores_frequentes))}")
                             
@@ -352,35 +1910,61 @@ if uploaded_file:
                                 st.sidebar.success(f"✅ {len(selecao)} valor(es) selecionado(s)")
                             
                             # Estatísticas
-                            st.sidebar.caption(f"📊 {len(valores_unicos)} valores únicos encontrados")
+                            if usar_esboco:
+                                distintos, erro_distintos = esboco.valores_distintos()
+                                lista = (f"os {len(valores_unicos)} mais frequentes na lista" if valores_unicos
+                                         else "nenhum se destaca; busque para ver os valores")
+                                amostra = f" em {esboco.linhas_amostradas} linhas amostradas" if esboco.amostrado else ""
+                                if erro_distintos:
+                                    st.sidebar.caption(f"📊 ≈{distintos} valores únicos{amostra} (±{erro_distintos:.1%}, erro padrão) | {lista}")
+                                else:
+                                    st.sidebar.caption(f"📊 {distintos} valores únicos encontrados{amostra}")
+                                st.sidebar.button(
+                                    "🎯 Calcular exato",
+                                    key=f"exato_botao_{coluna}",
+                                    on_click=calcular_perfil_exato,
+                                    args=(coluna,),
+                                    help="Conta todos os valores desta coluna e mostra as contagens com os demais filtros"
+                                )
+                            else:
+                                st.sidebar.caption(f"📊 {len(valores_unicos)} valores únicos encontrados")
                     
                     # Para colunas numéricas
                     elif np.issubdtype(df[coluna].dtype, np.number):
-                        min_val = float(df[coluna].min())
-                        max_val = float(df[coluna].max())
+                        ordenados = indexar_ordenacao(df[coluna], chave_dataset, coluna)['ordenados']
+                        min_val = float(ordenados[0])
+                        max_val = float(ordenados[-1])
                         
                         if min_val != max_val:
                             faixa = st.sidebar.slider(
                                 f"Faixa de valores:",
                                 min_value=min_val,
                                 max_value=max_val,
-                                value=(min_val, max_val),
+                                value=st.session_state.get(f"inicial_faixa_{coluna}", (min_val, max_val)),
                                 help=f"Selecione a faixa de valores",
                                 key=f"faixa_{coluna}"
                             )
                             filtros_aplicados[coluna] = faixa
-                            st.sidebar.caption(f"📈 Valores de {min_val:.2f} a {max_val:.2f}")
+                            mascara_faixa = mascaras_filtros[coluna] if filtros_previstos.get(coluna) == faixa else calcular_mascara_filtro(df, coluna, faixa, chave_dataset)
+                            na_faixa = int(np.count_nonzero(mascaras_outros[coluna] & mascara_faixa))
+                            st.sidebar.caption(f"📈 Valores de {min_val:.2f} a {max_val:.2f} | {na_faixa} registro(s) na faixa")
+                            if len(celulas_nao_numericas.get(coluna, ())):
+                                st.sidebar.caption(f"⚠️ {len(celulas_nao_numericas[coluna])} célula(s) não numérica(s) "
+                                                   f"(ex.: \"{celulas_nao_numericas[coluna].iloc[0]}\") ficam fora da faixa")
                     
                     # Para colunas booleanas ou com poucos valores únicos
                     elif df[coluna].nunique() <= 10:
-                        valores_unicos = df[coluna].dropna().unique()
+                        valores_unicos = motor_atual().valores_unicos(df[coluna])
+                        contagem_faceta = motor_atual().mais_frequentes(df[coluna][mascaras_outros[coluna]])
                         selecao = st.sidebar.multiselect(
                             f"Valores:",
                             options=valores_unicos,
-                            default=[],
+                            default=[v for v in st.session_state.get(f"selecao_{coluna}", []) if v in valores_unicos],
+                            format_func=lambda valor: f"{valor} ({contagem_faceta.get(valor, 0)})",
                             help=f"Selecione múltiplos valores",
                             key=f"multiselect_small_{coluna}"
                         )
+                        st.session_state[f"selecao_{coluna}"] = selecao
                         if selecao:
                             filtros_aplicados[coluna] = selecao
                 
@@ -389,29 +1973,95 @@ if uploaded_file:
                 
                 st.sidebar.markdown("---")
         
+        # Consulta avançada: expressão booleana sobre as colunas
+        st.sidebar.markdown("### 🧮 Consulta Avançada")
+        st.sidebar.text_area(
+            "Expressão (combina com os filtros acima):",
+            placeholder='Comunidade em ("Centro", "Norte") e não `Problema reportado` contém "lixo"',
+            help="Operadores: em / não em (lista entre parênteses), entre ... e ..., contém, =, !=, >, >=, <, <=; "
+                 "combine com e / ou / não e parênteses. Colunas com espaços vão entre crases (`Nome da coluna`); "
+                 "textos entre aspas; datas como dd/mm/aaaa. Acentos e maiúsculas são ignorados nos textos.",
+            height=90,
+            key="consulta_avancada"
+        )
+        if erro_consulta:
+            st.sidebar.error(f"❌ {erro_consulta}")
+        elif mascara_avancada is not None:
+            st.sidebar.caption(f"🧮 {int(np.count_nonzero(mascara_avancada))} registro(s) atendem à expressão")
+        
+        # Detecção de respondentes duplicados (entrevistas enviadas mais de uma vez)
+        st.sidebar.markdown("### 🔁 Duplicatas")
+        pagina_colunas_duplicatas = 1
+        if total_paginas_colunas > 1:
+            pagina_colunas_duplicatas = st.sidebar.number_input(
+                "Página de colunas que identificam o respondente:",
+                min_value=1,
+                max_value=total_paginas_colunas,
+                value=1,
+                help=f"{len(colunas_filtradas)} colunas em {total_paginas_colunas} páginas de {TAMANHO_PAGINA_COLUNAS}",
+                key="pagina_colunas_duplicatas"
+            )
+        
+        # Como no seletor de filtros: opções = seleção + página da busca rápida, seleção guardada à parte
+        selecao_colunas_duplicatas = st.session_state.get('selecao_colunas_duplicatas', [])
+        colunas_duplicatas_idx = st.sidebar.multiselect(
+            "Colunas que identificam o respondente:",
+            options=paginar_colunas(colunas_filtradas, selecao_colunas_duplicatas, pagina_colunas_duplicatas),
+            default=selecao_colunas_duplicatas,
+            format_func=formatar_coluna,
+            help="Linhas com os mesmos valores nessas colunas (ignorando acentos e maiúsculas) são duplicatas",
+            key="colunas_duplicatas"
+        )
+        st.session_state['selecao_colunas_duplicatas'] = colunas_duplicatas_idx
+        duplicatas = None
+        remover_duplicatas = False
+        if colunas_duplicatas_idx:
+            duplicatas = identificar_duplicatas(
+                df, chave_dataset, tuple(df.columns[idx] for idx in colunas_duplicatas_idx)
+            )
+            remover_duplicatas = st.sidebar.radio(
+                "Duplicatas:",
+                options=["Sinalizar", "Remover"],
+                horizontal=True,
+                help="Sinalizar marca as repetições nos resultados; Remover mantém só a primeira ocorrência",
+                key="modo_duplicatas"
+            ) == "Remover"
+            st.sidebar.caption(f"🔁 {int(duplicatas['duplicada'].sum())} duplicata(s) em "
+                               f"{int((duplicatas['tamanhos'] > 1).sum())} grupo(s)")
+        
         # Botão para limpar filtros
         col_btn1, col_btn2 = st.sidebar.columns(2)
         with col_btn1:
-            if st.button("🧹 Limpar Filtros", use_container_width=True):
-                filtros_aplicados = {}
-                st.rerun()
+            st.button("🧹 Limpar Filtros", use_container_width=True, on_click=limpar_filtros)
         with col_btn2:
             if st.button("🔄 Recarregar", use_container_width=True):
                 st.rerun()
         
-        # Aplicar filtros
-        df_filtrado = df.copy()
+        # Aplicar filtros (resultado em cache pela chave canônica da consulta,
+        # reaproveitando as máscaras já calculadas para as facetas)
+        impressao_filtros = calcular_impressao_filtros(filtros_aplicados)
+        if filtros_aplicados:
+            mascaras_prontas = {
+                coluna: mascara for coluna, mascara in mascaras_filtros.items()
+                if filtros_previstos.get(coluna) == filtros_aplicados.get(coluna)
+            }
+            posicoes_filtradas = resultado_consulta(df, filtros_aplicados, mascaras_prontas, chave_dataset, impressao_filtros)
+        else:
+            posicoes_filtradas = np.arange(len(df))
+        if mascara_avancada is not None:
+            posicoes_filtradas = posicoes_filtradas[mascara_avancada[posicoes_filtradas]]
+        if remover_duplicatas:
+            posicoes_filtradas = posicoes_filtradas[~duplicatas['duplicada'][posicoes_filtradas]]
+        df_filtrado = df.iloc[posicoes_filtradas] if len(posicoes_filtradas) < len(df) else df
+        # Exportações com o texto original das colunas promovidas a número
+        df_exportacao = com_textos_originais(df_filtrado, textos_originais)
         
-        for coluna, filtro in filtros_aplicados.items():
-            if isinstance(filtro, list):  # Filtro de múltiplos valores
-                # Converter tudo para string para comparação insensitive
-                mask = df_filtrado[coluna].astype(str).apply(lambda x: normalizar_texto(x)).isin(
-                    [normalizar_texto(str(x)) for x in filtro]
-                )
-                df_filtrado = df_filtrado[mask]
-            elif isinstance(filtro, tuple):  # Filtro de faixa numérica
-                mask = (df_filtrado[coluna] >= filtro[0]) & (df_filtrado[coluna] <= filtro[1])
-                df_filtrado = df_filtrado[mask]
+        # Restrições além dos filtros de coluna (entram na chave dos caches de resultados)
+        restricoes_extras = ()
+        if arvore_consulta is not None:
+            restricoes_extras += (('consulta', repr(arvore_consulta)),)
+        if remover_duplicatas:
+            restricoes_extras += (('sem_duplicatas',) + tuple(str(df.columns[idx]) for idx in colunas_duplicatas_idx),)
         
         # Mostrar estatísticas dos filtros
         st.sidebar.markdown("### 📊 Estatísticas")
@@ -423,6 +2073,11 @@ if uploaded_file:
         
         taxa_filtro = (len(df_filtrado)/len(df)*100) if len(df) > 0 else 0
         st.sidebar.metric("Taxa", f"{taxa_filtro:.1f}%")
+        if duplicatas is not None:
+            if remover_duplicatas:
+                st.sidebar.caption(f"🔁 {int(duplicatas['duplicada'].sum())} duplicata(s) removida(s) da contagem")
+            else:
+                st.sidebar.metric("Duplicatas nos resultados", int(duplicatas['duplicada'][posicoes_filtradas].sum()))
         
         # Área principal de resultados
         col1, col2 = st.columns([3, 1])
@@ -431,16 +2086,29 @@ if uploaded_file:
             st.subheader(f"📊 Resultados da Consulta ({len(df_filtrado)} registros)")
             
             if len(df_filtrado) > 0:
-                # Selecionar colunas para exibição com labels
-                colunas_exibicao_labels = st.multiselect(
+                # Selecionar colunas para exibição com labels (paginado em planilhas largas)
+                pagina_colunas_exibicao = 1
+                if len(todas_colunas) > TAMANHO_PAGINA_COLUNAS:
+                    pagina_colunas_exibicao = st.number_input(
+                        "Página de colunas para exibir:",
+                        min_value=1,
+                        max_value=(len(todas_colunas) - 1) // TAMANHO_PAGINA_COLUNAS + 1,
+                        value=1,
+                        key="pagina_colunas_exibicao"
+                    )
+                selecao_colunas_exibicao = st.session_state.get('selecao_colunas_exibicao', todas_colunas[:8])
+                colunas_exibicao_idx = st.multiselect(
                     "Selecione as colunas para exibir:",
-                    options=[label for _, label, _ in colunas_com_labels],
-                    default=[label for _, label, _ in colunas_com_labels[:8]] if len(colunas_com_labels) >= 8 else [label for _, label, _ in colunas_com_labels],
-                    help="Escolha quais colunas mostrar na tabela"
+                    options=paginar_colunas(todas_colunas, selecao_colunas_exibicao, pagina_colunas_exibicao),
+                    default=selecao_colunas_exibicao,
+                    format_func=formatar_coluna,
+                    help="Escolha quais colunas mostrar na tabela",
+                    key="colunas_exibicao"
                 )
+                st.session_state['selecao_colunas_exibicao'] = colunas_exibicao_idx
                 
-                # Converter labels de volta para nomes das colunas
-                colunas_exibicao = [label_para_coluna[label][0] for label in colunas_exibicao_labels]
+                # Converter índices de volta para nomes das colunas
+                colunas_exibicao = [df.columns[idx] for idx in colunas_exibicao_idx]
                 
                 if colunas_exibicao:
                     df_exibicao = df_filtrado[colunas_exibicao]
@@ -455,16 +2123,22 @@ if uploaded_file:
                             "Página:", 
                             min_value=1, 
                             max_value=total_pages, 
-                            value=1,
-                            help=f"Total de {total_pages} páginas"
+                            value=min(st.session_state.get('inicial_pagina', 1), total_pages),
+                            help=f"Total de {total_pages} páginas",
+                            key="pagina_resultados"
                         )
                     
                     start_idx = (page_number - 1) * items_per_page
                     end_idx = start_idx + items_per_page
                     
-                    # Mostrar dataframe com numeração correta
+                    # Mostrar dataframe com numeração correta (sinalizando duplicatas, se pedido)
+                    df_pagina = com_textos_originais(df_exibicao.iloc[start_idx:end_idx], textos_originais)
+                    if duplicatas is not None and not remover_duplicatas:
+                        df_pagina = df_pagina.assign(
+                            **{"🔁 Duplicata": duplicatas['duplicada'][posicoes_filtradas[start_idx:end_idx]]}
+                        )
                     st.dataframe(
-                        df_exibicao.iloc[start_idx:end_idx],
+                        df_pagina,
                         use_container_width=True,
                         height=500
                     )
@@ -496,70 +2170,148 @@ if uploaded_file:
                         if len(filtro) > 2:
                             valores += f"... (+{len(filtro)-2})"
                         st.write(f"• **{coluna}:** {valores}")
+                    elif isinstance(filtro[0], date):
+                        st.write(f"• **{coluna}:** {filtro[0]:%d/%m/%Y} a {filtro[1]:%d/%m/%Y}")
                     else:
                         st.write(f"• **{coluna}:** {filtro[0]:.2f} a {filtro[1]:.2f}")
-            else:
+            if arvore_consulta is not None:
+                st.write(f"**🧮 Expressão:** `{consulta_avancada.strip()}`")
+            if not filtros_aplicados and arvore_consulta is None:
                 st.info("ℹ️ Nenhum filtro aplicado")
             
+            # Guardar a consulta na URL para compartilhar
+            serializar_consulta_url(
+                chave_dataset,
+                colunas_filtro_selecionadas,
+                filtros_aplicados,
+                st.session_state.get('selecao_colunas_exibicao', todas_colunas[:8]),
+                st.session_state.get('pagina_resultados', 1),
+                consulta_avancada.strip() if arvore_consulta is not None else ''
+            )
+            st.caption("🔗 O endereço da página guarda esta consulta: copie-o para compartilhar "
+                       "(quem abrir precisa carregar a mesma planilha).")
+            
             # Botão rápido para exportar
             if len(df_filtrado) > 0:
                 st.markdown("---")
                 st.write("**📤 Exportação Rápida**")
                 
-                # Exportação rápida em CSV
-                csv_rapido = df_filtrado.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')
+                # Exportação rápida em CSV (o mesmo conteúdo serve ao "CSV Completo" abaixo)
+                csv_completo = motor_atual().exportar_csv(df_exportacao)
                 st.download_button(
                     label="💾 Baixar CSV",
-                    data=csv_rapido,
+                    data=csv_completo,
                     file_name=f"consulta_rapida_{datetime.now().strftime('%H%M')}.csv",
                     mime="text/csv",
                     use_container_width=True
                 )
         
+        # Relatório dos grupos de duplicatas (planilha inteira, maiores grupos primeiro)
+        if duplicatas is not None and duplicatas['repetida'].any():
+            with st.expander("🔁 Grupos de respondentes duplicados", expanded=False):
+                posicoes_repetidas = np.flatnonzero(duplicatas['repetida'])
+                grupos_repetidos = duplicatas['grupos'][posicoes_repetidas]
+                tamanhos_repetidos = duplicatas['tamanhos'][grupos_repetidos]
+                ordem = np.lexsort((posicoes_repetidas, grupos_repetidos, -tamanhos_repetidos))
+                posicoes_repetidas = posicoes_repetidas[ordem]
+                
+                # Numerar os grupos na ordem do relatório e limitar o que é exibido
+                numero_grupo = pd.factorize(duplicatas['grupos'][posicoes_repetidas])[0] + 1
+                limite_grupos = 200
+                exibir = numero_grupo <= limite_grupos
+                relatorio = com_textos_originais(
+                    df.iloc[posicoes_repetidas[exibir]][[df.columns[idx] for idx in colunas_duplicatas_idx]], textos_originais
+                )
+                relatorio.insert(0, "Ocorrências", duplicatas['tamanhos'][duplicatas['grupos'][posicoes_repetidas[exibir]]])
+                relatorio.insert(0, "Grupo", numero_grupo[exibir])
+                relatorio.insert(0, "Linha Excel", posicoes_repetidas[exibir] + 2)
+                
+                st.caption(f"{int(numero_grupo.max())} grupo(s) com {len(posicoes_repetidas)} linha(s); "
+                           f"mostrando até {limite_grupos} grupos")
+                st.dataframe(relatorio, use_container_width=True, hide_index=True, height=400)
+        
+        # Seção de agregação (tabela dinâmica)
+        if len(df_filtrado) > 0:
+            st.markdown("---")
+            with st.expander("📈 Agregação dos Resultados (tabela dinâmica)", expanded=False):
+                colunas_numericas = [c for c in df.columns if np.issubdtype(df[c].dtype, np.number)]
+                col_agr1, col_agr2, col_agr3 = st.columns(3)
+                with col_agr1:
+                    colunas_grupo = st.multiselect(
+                        "Agrupar por:",
+                        options=list(df.columns),
+                        max_selections=3,
+                        help="Ex: \"Problema reportado\" e \"Comunidade\"",
+                        key="agregacao_grupo"
+                    )
+                with col_agr2:
+                    colunas_metricas = st.multiselect(
+                        "Colunas numéricas:",
+                        options=[c for c in colunas_numericas if c not in colunas_grupo],
+                        help="Usadas nas métricas de soma e média",
+                        key="agregacao_metricas"
+                    )
+                with col_agr3:
+                    operacoes = st.multiselect(
+                        "Métricas:",
+                        options=['Contagem', 'Soma', 'Média'],
+                        default=['Contagem'],
+                        key="agregacao_operacoes"
+                    )
+                
+                if colunas_grupo and operacoes:
+                    df_agregado = agregar_resultados(
+                        df, df_filtrado, filtros_aplicados, chave_dataset,
+                        impressao_filtros,
+                        tuple(colunas_grupo), tuple(colunas_metricas), tuple(operacoes),
+                        restricoes_extras
+                    )
+                    colunas_valor = [c for c in df_agregado.columns if c not in colunas_grupo]
+                    
+                    # Duas colunas de agrupamento: opção de cruzar em formato de tabela dinâmica
+                    if len(colunas_grupo) == 2 and colunas_valor and st.checkbox("Exibir cruzado (linhas × colunas)", key="agregacao_cruzada"):
+                        valor_cruzado = st.selectbox("Valor exibido:", colunas_valor, key="agregacao_valor")
+                        df_exibicao_agregada = df_agregado.pivot(
+                            index=colunas_grupo[0], columns=colunas_grupo[1], values=valor_cruzado
+                        )
+                    else:
+                        df_exibicao_agregada = df_agregado
+                    
+                    st.dataframe(df_exibicao_agregada, use_container_width=True)
+                    st.caption(f"📊 {len(df_agregado)} grupo(s) sobre {len(df_filtrado)} registros filtrados")
+                    st.download_button(
+                        label="💾 Baixar agregação (CSV)",
+                        data=motor_atual().exportar_csv(df_exibicao_agregada, index=df_exibicao_agregada is not df_agregado),
+                        file_name=f"agregacao_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+                        mime="text/csv"
+                    )
+                else:
+                    st.info("📝 Escolha ao menos uma coluna de agrupamento e uma métrica.")
+        
         # Seção de exportação completa
         if len(df_filtrado) > 0:
             st.markdown("---")
             st.subheader("📤 Exportar Resultados Completos")
             
-            col_export1, col_export2, col_export3 = st.columns(3)
+            col_export1, col_export2, col_export3, col_export4 = st.columns(4)
             
             with col_export1:
-                # Exportar para Excel
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df_filtrado.to_excel(writer, index=False, sheet_name='Dados_Filtrados')
-                    
-                    # Adicionar uma aba com metadados
-                    filtros_texto = []
-                    for coluna, filtro in filtros_aplicados.items():
-                        if isinstance(filtro, list):
-                            filtros_texto.append(f"{coluna}: {', '.join(map(str, filtro))}")
-                        else:
-                            filtros_texto.append(f"{coluna}: {filtro[0]} a {filtro[1]}")
+                # Exportar para Excel (o buffer é fechado logo após gerar os bytes)
+                with io.BytesIO() as output:
+                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                        df_exportacao.to_excel(writer, index=False, sheet_name='Dados_Filtrados')
                     
-                    metadata = pd.DataFrame({
-                        'Parâmetro': [
-                            'Data da consulta', 
-                            'Total de registros', 
-                            'Registros filtrados',
-                            'Filtros aplicados', 
-                            'Arquivo original',
-                            'Detalhes dos Filtros'
-                        ],
-                        'Valor': [
-                            datetime.now().strftime('%d/%m/%Y %H:%M'),
-                            len(df),
-                            len(df_filtrado),
-                            len(filtros_aplicados),
-                            uploaded_file.name,
-                            '; '.join(filtros_texto) if filtros_texto else 'Nenhum'
-                        ]
-                    })
-                    metadata.to_excel(writer, index=False, sheet_name='Metadados')
+                        # Adicionar uma aba com metadados
+                        metadata = montar_metadados_consulta(
+                            len(df), len(df_filtrado), filtros_aplicados, uploaded_file.name,
+                            consulta_avancada.strip() if arvore_consulta is not None else ''
+                        )
+                        metadata.to_excel(writer, index=False, sheet_name='Metadados')
+                    excel_completo = output.getvalue()
                 
                 st.download_button(
                     label="📊 Excel Completo",
-                    data=output.getvalue(),
+                    data=excel_completo,
                     file_name=f"consulta_comunidades_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
                     mime="application/vnd.ms-excel",
                     use_container_width=True
@@ -567,10 +2319,9 @@ if uploaded_file:
             
             with col_export2:
                 # Exportar para CSV
-                csv_data = df_filtrado.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')
                 st.download_button(
                     label="📝 CSV Completo",
-                    data=csv_data,
+                    data=csv_completo,
                     file_name=f"consulta_comunidades_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
                     mime="text/csv",
                     use_container_width=True
@@ -579,14 +2330,63 @@ if uploaded_file:
             with col_export3:
                 # Exportar apenas colunas selecionadas
                 if 'colunas_exibicao' in locals() and colunas_exibicao:
-                    csv_selecionado = df_filtrado[colunas_exibicao].to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')
+                    csv_selecionado = motor_atual().exportar_csv(df_exportacao[colunas_exibicao])
                     st.download_button(
                         label="🎯 Colunas Selecionadas",
-                        data=cselecionado,
+                        data=csv_selecionado,
                         file_name=f"colunas_selecionadas_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
                         mime="text/csv",
                         use_container_width=True
                     )
+            
+            with col_export4:
+                # Exportar para Parquet (colunar, para análises em outras ferramentas)
+                try:
+                    parquet_completo = exportar_parquet_consulta(
+                        df_exportacao, chave_dataset, impressao_filtros, restricoes_extras
+                    )
+                except Exception:
+                    parquet_completo = None
+                if parquet_completo is not None:
+                    st.download_button(
+                        label="🧱 Parquet Completo",
+                        data=parquet_completo,
+                        file_name=f"consulta_comunidades_{datetime.now().strftime('%Y%m%d_%H%M')}.parquet",
+                        mime="application/octet-stream",
+                        use_container_width=True
+                    )
+                else:
+                    st.caption("🧱 Parquet indisponível para estes dados (colunas com tipos misturados).")
+            
+            # Relatório PDF: só é gerado quando pedido e fica em cache pela impressão da consulta
+            colunas_pdf = list(colunas_exibicao) if 'colunas_exibicao' in locals() and colunas_exibicao else list(df_filtrado.columns)
+            if len(colunas_pdf) > 10:
+                st.caption(f"📄 O relatório PDF mostra as 10 primeiras de {len(colunas_pdf)} colunas; escolha as colunas na seção de exibição.")
+                colunas_pdf = colunas_pdf[:10]
+            chave_relatorio = (chave_dataset, impressao_filtros, restricoes_extras, tuple(colunas_pdf))
+            st.button(
+                "📄 Gerar relatório PDF",
+                on_click=solicitar_relatorio_pdf,
+                args=(chave_relatorio,),
+                help="Filtros, contagens, valores mais frequentes das colunas filtradas e a tabela de resultados"
+            )
+            if st.session_state.get('relatorio_pdf') == chave_relatorio:
+                with st.spinner("📄 Gerando relatório PDF..."):
+                    relatorio_pdf = gerar_pdf_consulta(
+                        df_exportacao,
+                        montar_metadados_consulta(
+                            len(df), len(df_filtrado), filtros_aplicados, uploaded_file.name,
+                            consulta_avancada.strip() if arvore_consulta is not None else ''
+                        ),
+                        chave_dataset, impressao_filtros, restricoes_extras,
+                        tuple(filtros_aplicados), tuple(colunas_pdf)
+                    )
+                st.download_button(
+                    label="📄 Baixar relatório PDF",
+                    data=relatorio_pdf,
+                    file_name=f"relatorio_consulta_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
+                    mime="application/pdf"
+                )
 
     except Exception as e:
         st.error(f"❌ Erro ao processar o arquivo: {str(e)}")
@@ -0,0 +1,245 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+# Motores opcionais: só aparecem na seleção quando a biblioteca está instalada
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+# Erros de conversão que fazem um motor colunar recorrer à implementação em pandas
+# (ex.: colunas de texto com tipos misturados vindas do Excel)
+ERROS_CONVERSAO = (TypeError, ValueError)
+if pa is not None:
+    ERROS_CONVERSAO += (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError)
+
+
+# Função para trocar os nulos (None) das dimensões agrupadas pelo NaN que o groupby do pandas devolve
+def nulos_como_pandas(resultado, dimensoes):
+    for dimensao in dimensoes:
+        if resultado[dimensao].dtype == object:
+            resultado[dimensao] = resultado[dimensao].where(resultado[dimensao].notna(), np.nan)
+    return resultado
+
+
+class MotorPandas:
+    """Operações de consulta usadas pelo app, implementadas com pandas/numpy (motor padrão)
+
+    Os demais motores herdam desta classe e recorrem a ela quando não conseguem converter os dados,
+    então todos devolvem os mesmos resultados.
+    """
+    nome = "pandas"
+    descricao = "pandas (padrão)"
+
+    def mascara_codigos(self, codigos, codigos_selecionados):
+        """Linhas cujo código de chave normalizada está entre os selecionados"""
+        return np.isin(codigos, np.asarray(codigos_selecionados, dtype=codigos.dtype))
+
+    def mascara_valores(self, dados, valores):
+        """Linhas cujo valor está na lista (comparação exata)"""
+        return dados.isin(valores).to_numpy()
+
+    def mascara_faixa(self, dados, inicio, fim):
+        """Linhas com valor em [inicio, fim]; nulos ficam de fora"""
+        return dados.between(inicio, fim).to_numpy()
+
+    def contar_codigos(self, codigos, mascara, total_chaves):
+        """Quantidade de linhas por código (só as linhas da máscara; -1 = vazio é ignorado)"""
+        selecionados = codigos[mascara]
+        return np.bincount(selecionados[selecionados >= 0], minlength=total_chaves)
+
+    def valores_unicos(self, dados):
+        """Valores distintos não nulos, na ordem em que aparecem"""
+        return dados.dropna().unique()
+
+    def mais_frequentes(self, dados, limite=None):
+        """Contagem por valor (nulos de fora), da maior para a menor; empates na ordem de aparição"""
+        contagem = dados.value_counts(sort=False)
+        ordem = np.argsort(-contagem.to_numpy(), kind='stable')
+        return contagem.iloc[ordem[:limite]].rename('Registros')
+
+    def agrupar(self, df, dimensoes, metricas):
+        """Registros, soma e nº de valores de cada métrica por grupo (nulos formam um grupo)"""
+        agrupado = df.groupby(list(dimensoes), dropna=False, sort=False)
+        resultado = agrupado.size().rename('Registros').to_frame()
+        for metrica in metricas:
+            resultado[f"{metrica} - soma"] = agrupado[metrica].sum()
+            resultado[f"{metrica} - n"] = agrupado[metrica].count()
+        return resultado.reset_index()
+
+    def exportar_csv(self, df, index=False):
+        """CSV em UTF-8 com BOM (abre com acentos corretos no Excel)"""
+        return df.to_csv(index=index, encoding='utf-8-sig').encode('utf-8-sig')
+
+    def exportar_parquet(self, df):
+        with io.BytesIO() as saida:
+            df.to_parquet(saida, index=False)
+            return saida.getvalue()
+
+
+class MotorArrow(MotorPandas):
+    """Operações com pyarrow.compute (kernels colunares, com várias threads em agregações e Parquet)
+
+    O CSV continua sendo gerado pelo pandas, para o arquivo exportado não mudar de formato.
+    """
+    nome = "pyarrow"
+    descricao = "PyArrow compute (multithread)"
+
+    def mascara_codigos(self, codigos, codigos_selecionados):
+        selecionados = pa.array(np.asarray(codigos_selecionados, dtype=codigos.dtype))
+        return pc.is_in(pa.array(codigos), value_set=selecionados).to_numpy(zero_copy_only=False)
+
+    def mascara_valores(self, dados, valores):
+        try:
+            coluna = pa.array(dados, from_pandas=True)
+            conjunto = pa.array(list(valores), type=coluna.type)
+        except ERROS_CONVERSAO:
+            return super().mascara_valores(dados, valores)
+        return pc.is_in(coluna, value_set=conjunto).fill_null(False).to_numpy(zero_copy_only=False)
+
+    def mascara_faixa(self, dados, inicio, fim):
+        try:
+            coluna = pa.array(dados, from_pandas=True)
+            dentro = pc.and_(pc.greater_equal(coluna, inicio), pc.less_equal(coluna, fim))
+        except ERROS_CONVERSAO:
+            return super().mascara_faixa(dados, inicio, fim)
+        return dentro.fill_null(False).to_numpy(zero_copy_only=False)
+
+    def contar_codigos(self, codigos, mascara, total_chaves):
+        selecionados = pc.filter(pa.array(codigos), pa.array(mascara))
+        contagem = pc.value_counts(pc.filter(selecionados, pc.greater_equal(selecionados, 0)))
+        resultado = np.zeros(total_chaves, dtype=np.int64)
+        resultado[contagem.field('values').to_numpy()] = contagem.field('counts').to_numpy()
+        return resultado
+
+    def valores_unicos(self, dados):
+        try:
+            unicos = pc.unique(pa.array(dados, from_pandas=True).drop_null())
+        except ERROS_CONVERSAO:
+            return super().valores_unicos(dados)
+        return unicos.to_pandas().to_numpy()
+
+    def mais_frequentes(self, dados, limite=None):
+        try:
+            contagem = pc.value_counts(pa.array(dados, from_pandas=True).drop_null())
+        except ERROS_CONVERSAO:
+            return super().mais_frequentes(dados, limite)
+        quantidades = contagem.field('counts').to_numpy()
+        ordem = np.argsort(-quantidades, kind='stable')[:limite]
+        return pd.Series(
+            quantidades[ordem],
+            index=pd.Index(contagem.field('values').to_pandas().to_numpy()[ordem], name=dados.name),
+            name='Registros'
+        )
+
+    def agrupar(self, df, dimensoes, metricas):
+        dimensoes, metricas = list(dimensoes), list(metricas)
+        try:
+            tabela = pa.Table.from_pandas(df[dimensoes + metricas], preserve_index=False)
+        except ERROS_CONVERSAO:
+            return super().agrupar(df, dimensoes, metricas)
+        soma_sem_valores_zero = pc.ScalarAggregateOptions(min_count=0)
+        agregacoes = [([], 'count_all')]
+        for metrica in metricas:
+            agregacoes += [(metrica, 'sum', soma_sem_valores_zero), (metrica, 'count')]
+        agrupado = tabela.group_by(dimensoes).aggregate(agregacoes).to_pandas()
+
+        nomes = {'count_all': 'Registros'}
+        for metrica in metricas:
+            nomes[f"{metrica}_sum"] = f"{metrica} - soma"
+            nomes[f"{metrica}_count"] = f"{metrica} - n"
+        colunas = dimensoes + ['Registros'] + [nomes[f"{m}_{op}"] for m in metricas for op in ('sum', 'count')]
+        return nulos_como_pandas(agrupado.rename(columns=nomes)[colunas], dimensoes)
+
+    def exportar_parquet(self, df):
+        try:
+            tabela = pa.Table.from_pandas(df, preserve_index=False)
+        except ERROS_CONVERSAO:
+            return super().exportar_parquet(df)
+        saida = pa.BufferOutputStream()
+        pq.write_table(tabela, saida)
+        return saida.getvalue().to_pybytes()
+
+
+class MotorPolars(MotorPandas):
+    """Operações com Polars (execução paralela em todas as operações de coluna)"""
+    nome = "polars"
+    descricao = "Polars (multithread)"
+
+    def mascara_codigos(self, codigos, codigos_selecionados):
+        selecionados = pl.Series(np.asarray(codigos_selecionados, dtype=codigos.dtype))
+        return pl.Series(codigos).is_in(selecionados.implode()).to_numpy()
+
+    def mascara_valores(self, dados, valores):
+        try:
+            coluna = pl.from_pandas(dados)
+            return coluna.is_in(pl.Series(list(valores), dtype=coluna.dtype).implode()).fill_null(False).to_numpy()
+        except (pl.exceptions.PolarsError,) + ERROS_CONVERSAO:
+            return super().mascara_valores(dados, valores)
+
+    def mascara_faixa(self, dados, inicio, fim):
+        try:
+            return pl.from_pandas(dados).is_between(inicio, fim).fill_null(False).to_numpy()
+        except (pl.exceptions.PolarsError,) + ERROS_CONVERSAO:
+            return super().mascara_faixa(dados, inicio, fim)
+
+    def contar_codigos(self, codigos, mascara, total_chaves):
+        selecionados = pl.Series(codigos).filter(pl.Series(mascara))
+        contagem = selecionados.filter(selecionados >= 0).value_counts()
+        resultado = np.zeros(total_chaves, dtype=np.int64)
+        resultado[contagem[:, 0].to_numpy()] = contagem[:, 1].to_numpy()
+        return resultado
+
+    def agrupar(self, df, dimensoes, metricas):
+        dimensoes, metricas = list(dimensoes), list(metricas)
+        try:
+            tabela = pl.from_pandas(df[dimensoes + metricas])
+        except (pl.exceptions.PolarsError,) + ERROS_CONVERSAO:
+            return super().agrupar(df, dimensoes, metricas)
+        agregacoes = [pl.len().alias('Registros')]
+        for metrica in metricas:
+            # NaN do pandas conta como ausente, como no groupby do pandas
+            valores = pl.col(metrica).fill_nan(None) if tabela.schema[metrica].is_float() else pl.col(metrica)
+            agregacoes += [
+                valores.sum().alias(f"{metrica} - soma"),
+                valores.count().alias(f"{metrica} - n"),
+            ]
+        return nulos_como_pandas(tabela.group_by(dimensoes, maintain_order=True).agg(agregacoes).to_pandas(), dimensoes)
+
+    def exportar_parquet(self, df):
+        try:
+            tabela = pl.from_pandas(df)
+        except (pl.exceptions.PolarsError,) + ERROS_CONVERSAO:
+            return super().exportar_parquet(df)
+        with io.BytesIO() as saida:
+            tabela.write_parquet(saida)
+            return saida.getvalue()
+
+
+MOTORES = {motor.nome: motor for motor in (MotorPandas, MotorArrow, MotorPolars)}
+
+
+# Função para listar os motores cujas bibliotecas estão instaladas
+def motores_disponiveis():
+    disponiveis = ["pandas"]
+    if pa is not None:
+        disponiveis.append("pyarrow")
+    if pl is not None:
+        disponiveis.append("polars")
+    return disponiveis
+
+
+# Função para obter um motor pelo nome (pandas quando o nome não está disponível)
+def obter_motor(nome="pandas"):
+    if nome not in motores_disponiveis():
+        nome = "pandas"
+    return MOTORES[nome]()
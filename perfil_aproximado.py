@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+# Textos que a planilha usa para células vazias (os mesmos ignorados nas contagens exatas do app)
+VALORES_VAZIOS = ['', 'nan', 'NaN']
+HASHES_VAZIOS = pd.util.hash_array(np.array(VALORES_VAZIOS, dtype=object), categorize=False)
+
+
+class HyperLogLog:
+    """Estimativa do número de valores distintos com memória fixa (2^precisao registradores de 1 byte)
+
+    O erro padrão relativo é 1,04/√m (≈0,8% na precisão padrão). Esboços de blocos diferentes
+    se combinam pelo máximo de cada registrador, sem perder precisão.
+    """
+
+    def __init__(self, precisao=14):
+        self.precisao = precisao
+        self.registradores = np.zeros(1 << precisao, dtype=np.uint8)
+
+    def adicionar_hashes(self, hashes):
+        """Registra hashes de 64 bits (ex.: pd.util.hash_array dos valores)"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        bits_resto = 64 - self.precisao
+        posicoes = (hashes >> np.uint64(bits_resto)).astype(np.intp)
+        resto = hashes & np.uint64((1 << bits_resto) - 1)
+        # Posição do primeiro bit 1 do resto: o frexp dá o nº de bits (o resto cabe na mantissa do float64)
+        postos = (bits_resto + 1 - np.frexp(resto.astype(np.float64))[1]).astype(np.uint8)
+        np.maximum.at(self.registradores, posicoes, postos)
+
+    def mesclar(self, outro):
+        np.maximum(self.registradores, outro.registradores, out=self.registradores)
+        return self
+
+    def estimar(self):
+        m = len(self.registradores)
+        alfa = 0.7213 / (1 + 1.079 / m)
+        estimativa = alfa * m * m / np.sum(np.ldexp(1.0, -self.registradores.astype(np.int64)))
+        vazios = int(np.count_nonzero(self.registradores == 0))
+        if estimativa <= 2.5 * m and vazios:
+            # Poucos valores: contagem linear pelos registradores vazios é mais precisa
+            estimativa = m * np.log(m / vazios)
+        return int(round(estimativa))
+
+    @property
+    def erro_padrao(self):
+        return 1.04 / np.sqrt(len(self.registradores))
+
+
+class ResumoFrequentes:
+    """Valores mais frequentes com no máximo `capacidade` contadores (resumo de Misra-Gries mesclável)
+
+    Cada contagem guardada subestima a real em no máximo `erro_maximo`, que nunca passa de
+    total/(capacidade+1); todo valor mais frequente que isso está no resumo. Os contadores são
+    indexados pelo hash do valor; o texto só é guardado para os valores que ficam no resumo.
+    """
+
+    def __init__(self, capacidade=200):
+        self.capacidade = capacidade
+        self.contadores = pd.Series(dtype=np.int64, index=pd.Index([], dtype=np.uint64))
+        self.textos = pd.Series(dtype=object, index=pd.Index([], dtype=np.uint64))
+        self.erro_maximo = 0
+        self.total = 0
+
+    def adicionar_contagens(self, contagens, buscar_textos):
+        """Soma as contagens de um bloco (Series hash → quantidade); `buscar_textos` devolve o texto
+        (Series hash → texto) dos hashes pedidos"""
+        self.total += int(contagens.sum())
+        self.reduzir(self.contadores.add(contagens, fill_value=0) if len(self.contadores) else contagens, buscar_textos)
+
+    def mesclar(self, outro):
+        self.total += outro.total
+        self.erro_maximo += outro.erro_maximo
+        self.reduzir(self.contadores.add(outro.contadores, fill_value=0), outro.textos.reindex)
+        return self
+
+    def reduzir(self, contadores, buscar_textos):
+        """Mantém só os `capacidade` maiores, descontando de todos a contagem do primeiro que sai"""
+        contadores = contadores.astype(np.int64)
+        if len(contadores) > self.capacidade:
+            corte = int(np.partition(contadores.to_numpy(), -(self.capacidade + 1))[-(self.capacidade + 1)])
+            contadores = contadores[contadores.to_numpy() > corte] - corte
+            self.erro_maximo += corte
+        self.contadores = contadores
+        conhecidos = contadores.index.isin(self.textos.index)
+        self.textos = pd.concat([
+            self.textos[self.textos.index.isin(contadores.index)], buscar_textos(contadores.index[~conhecidos])
+        ])
+
+    @property
+    def exato(self):
+        """Nenhum valor foi descartado: as contagens e o nº de valores distintos são exatos"""
+        return self.erro_maximo == 0
+
+    def mais_frequentes(self, limite=None):
+        """Contagem mínima garantida por valor, da maior para a menor"""
+        contadores = self.contadores.sort_values(ascending=False, kind='stable').iloc[:limite]
+        return pd.Series(contadores.to_numpy(), index=pd.Index(self.textos.reindex(contadores.index).to_numpy(), dtype=object),
+                         name='Registros')
+
+
+class EsbocoColuna:
+    """Perfil aproximado de uma coluna: valores distintos (HyperLogLog) e mais frequentes (Misra-Gries)
+
+    Cada bloco de linhas gera o seu esboço, que é mesclado ao da coluna; a memória não depende do
+    número de linhas nem de valores distintos. Quando o esboço vem de uma amostra das linhas, as
+    contagens são extrapoladas para a coluna inteira e os valores distintos contam só os da amostra.
+    """
+
+    def __init__(self, precisao=14, capacidade=200):
+        self.distintos = HyperLogLog(precisao)
+        self.frequentes = ResumoFrequentes(capacidade)
+        self.linhas = 0
+        self.linhas_amostradas = 0
+
+    @classmethod
+    def de_bloco(cls, bloco, **parametros):
+        """Esboço de um bloco a partir dos valores crus (fatorados e com hash só dos distintos), sem
+        converter o bloco para texto; só os valores que ficam no resumo de frequentes viram texto"""
+        esboco = cls(**parametros)
+        codigos, unicos = pd.factorize(bloco.to_numpy(dtype=object))
+        # O hash de um valor é o do seu texto (30 e "30" caem no mesmo contador, como no astype(str))
+        hashes = pd.util.hash_array(np.asarray(unicos, dtype=object), categorize=False)
+        preenchidos = ~np.isin(hashes, HASHES_VAZIOS)
+        contagens = pd.Series(np.bincount(codigos[codigos >= 0], minlength=len(unicos))[preenchidos],
+                              index=hashes[preenchidos])
+        textos = pd.Series(np.asarray(unicos, dtype=object)[preenchidos], index=contagens.index)
+        if not contagens.index.is_unique:
+            contagens = contagens.groupby(level=0).sum()
+            textos = textos[~textos.index.duplicated()]
+        esboco.distintos.adicionar_hashes(contagens.index.to_numpy())
+        esboco.frequentes.adicionar_contagens(contagens, lambda procurados: textos.reindex(procurados).map(str))
+        esboco.linhas = esboco.linhas_amostradas = len(bloco)
+        return esboco
+
+    def mesclar(self, outro):
+        self.distintos.mesclar(outro.distintos)
+        self.frequentes.mesclar(outro.frequentes)
+        self.linhas += outro.linhas
+        self.linhas_amostradas += outro.linhas_amostradas
+        return self
+
+    @property
+    def amostrado(self):
+        return self.linhas_amostradas < self.linhas
+
+    @property
+    def fator_amostra(self):
+        return self.linhas / self.linhas_amostradas if self.linhas_amostradas else 1.0
+
+    def mais_frequentes(self, limite=None):
+        """Contagem por valor extrapolada para a coluna (a mínima garantida quando não há amostra)"""
+        frequentes = self.frequentes.mais_frequentes(limite)
+        return (frequentes * self.fator_amostra).round().astype(np.int64) if self.amostrado else frequentes
+
+    @property
+    def erro_contagem(self):
+        """Quanto cada contagem pode estar abaixo da real pelo resumo (sem contar o erro da amostra)"""
+        return int(round(self.frequentes.erro_maximo * self.fator_amostra))
+
+    def valores_distintos(self):
+        """(estimativa, erro padrão relativo); exata (erro 0) quando o resumo de frequentes guardou todos os
+        valores. Com amostra, é o número de valores distintos da amostra (a coluna pode ter mais)"""
+        if self.frequentes.exato:
+            return len(self.frequentes.contadores), 0.0
+        return self.distintos.estimar(), self.distintos.erro_padrao
+
+
+# Função para esboçar uma coluna bloco a bloco (mesclando o esboço de cada bloco)
+def esbocar_serie(dados, tamanho_bloco=50_000, linhas_amostra=None, **parametros):
+    """Com `linhas_amostra`, colunas maiores são esboçadas por uma amostra aleatória (e reprodutível)
+    das linhas, espalhada pela planilha inteira mesmo se ela estiver ordenada"""
+    esboco = EsbocoColuna(**parametros)
+    amostra = dados
+    if linhas_amostra and len(dados) > linhas_amostra:
+        amostra = dados.iloc[np.sort(np.random.default_rng(0).choice(len(dados), linhas_amostra, replace=False))]
+    for inicio in range(0, len(amostra), tamanho_bloco):
+        esboco.mesclar(EsbocoColuna.de_bloco(amostra.iloc[inicio:inicio + tamanho_bloco], **parametros))
+    esboco.linhas = len(dados)
+    return esboco
@@ -0,0 +1,73 @@
+"""Testes das funções do leitor de planilhas que não dependem da interface
+
+Uso:
+    python -m pytest test_leitor_de_planilha.py
+"""
+import io
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Importar o app executa o script sem servidor; os avisos do Streamlit sobre isso não interessam aqui
+logging.disable(logging.WARNING)
+import leitor_de_planilha as leitor  # noqa: E402
+logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def base():
+    return pd.DataFrame({
+        "Nome": [f"Pessoa {i}" for i in range(6)],
+        "Comunidade": ["Centro", "Norte", "Centro", "Vila Aliança", "Norte", "Centro"],
+        "Idade": [30, 41, 25, 60, 33, 30],
+    })
+
+
+def listas(versao):
+    return {chave: versao[chave].tolist() for chave in ("inseridas", "removidas", "alteradas")}
+
+
+def test_comparar_versoes_identica(base):
+    versao = leitor.comparar_versoes(base, base.copy())
+    assert versao["origem"].tolist() == list(range(6))
+    assert listas(versao) == {"inseridas": [], "removidas": [], "alteradas": []}
+    assert versao["iguais"] == 6
+
+
+def test_comparar_versoes_so_remocoes(base):
+    versao = leitor.comparar_versoes(base, base.drop(index=[1, 4]).reset_index(drop=True))
+    assert versao["origem"].tolist() == [0, 2, 3, 5]
+    assert listas(versao) == {"inseridas": [], "removidas": [1, 4], "alteradas": []}
+
+
+def test_comparar_versoes_so_insercoes_no_fim(base):
+    novas = pd.DataFrame({"Nome": ["Pessoa 6", "Pessoa 7"], "Comunidade": ["Norte", "Centro"], "Idade": [19, 52]})
+    versao = leitor.comparar_versoes(base, pd.concat([base, novas], ignore_index=True))
+    assert versao["origem"].tolist() == list(range(6)) + [-1, -1]
+    assert listas(versao) == {"inseridas": [6, 7], "removidas": [], "alteradas": []}
+
+
+def test_comparar_versoes_alteracao(base):
+    nova = base.copy()
+    nova.loc[2, "Idade"] = 26
+    versao = leitor.comparar_versoes(base, nova)
+    assert listas(versao) == {"inseridas": [], "removidas": [], "alteradas": [2]}
+    assert np.array_equal(versao["origem"], [0, 1, -1, 3, 4, 5])
+
+
+def test_ingestao_com_erro_e_refeita(base):
+    planilha = io.BytesIO()
+    base.to_excel(planilha, index=False)
+    planilha.size = planilha.tell()
+    ingestao = leitor.obter_ingestao("teste-ingestao-com-erro")
+    ingestao.update(estado="erro", erro=ValueError("falha anterior"))
+
+    leitor.iniciar_ingestao(ingestao, planilha, "teste-ingestao-com-erro")
+    inicio = time.perf_counter()
+    while ingestao["estado"] not in ("pronto", "erro") and time.perf_counter() - inicio < 30:
+        time.sleep(0.05)
+    assert ingestao["estado"] == "pronto" and ingestao["erro"] is None
+    assert ingestao["df"]["Nome"].tolist() == base["Nome"].tolist()
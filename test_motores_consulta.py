@@ -0,0 +1,163 @@
+"""Testes dos motores de consulta: os motores colunares devem devolver o mesmo que o MotorPandas
+
+Uso:
+    python -m pytest test_motores_consulta.py
+"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark_motores import gerar_dados, iguais_grupos
+from motores_consulta import ERROS_CONVERSAO, MotorPandas, motores_disponiveis, obter_motor
+
+MOTORES_COLUNARES = [nome for nome in motores_disponiveis() if nome != "pandas"]
+pytestmark = pytest.mark.skipif(not MOTORES_COLUNARES, reason="pyarrow e polars não instalados")
+
+
+@pytest.fixture(params=MOTORES_COLUNARES)
+def motor(request):
+    return obter_motor(request.param)
+
+
+@pytest.fixture
+def pandas():
+    return MotorPandas()
+
+
+# Colunas no formato em que chegam do Excel, com os casos que mais divergem entre bibliotecas
+COLUNAS = {
+    "texto": pd.Series(["Centro", None, "Norte", "", "Centro", np.nan, "Vila Aliança"], dtype=object),
+    "numeros": pd.Series([1.5, np.nan, 3.0, 1.5, np.nan, -2.0, 0.0]),
+    "inteiros": pd.Series([3, 1, 3, 2, 3, 1, 7]),
+    "misturada": pd.Series(["30", 30, "n/a", 12.5, None, "30", 30], dtype=object),
+    "datas": pd.Series(pd.to_datetime(["2024-01-05", None, "2024-02-01", "2024-01-05", "2023-12-31", None, "2024-03-10"])),
+    "vazia": pd.Series([], dtype=object),
+    "so_nulos": pd.Series([None, np.nan, None], dtype=object),
+}
+
+
+def iguais_series(esperado, obtido):
+    # Mesmos valores e contagens na mesma ordem (NaN/NaT iguais entre si)
+    return (pd.Index(esperado.index).equals(pd.Index(obtido.index))
+            and esperado.tolist() == obtido.tolist() and esperado.name == obtido.name)
+
+
+@pytest.mark.parametrize("coluna", COLUNAS)
+def test_valores_unicos(motor, pandas, coluna):
+    esperado = pandas.valores_unicos(COLUNAS[coluna])
+    obtido = motor.valores_unicos(COLUNAS[coluna])
+    assert pd.Index(esperado).equals(pd.Index(obtido))
+
+
+@pytest.mark.parametrize("coluna", COLUNAS)
+@pytest.mark.parametrize("limite", [None, 2, 0])
+def test_mais_frequentes(motor, pandas, coluna, limite):
+    dados = COLUNAS[coluna].rename(coluna)
+    assert iguais_series(pandas.mais_frequentes(dados, limite), motor.mais_frequentes(dados, limite))
+
+
+@pytest.mark.parametrize("coluna, valores", [
+    ("texto", ["Centro", ""]),
+    ("texto", []),
+    ("numeros", [1.5, 0.0]),
+    ("inteiros", [3]),
+    ("misturada", ["30", 12.5]),
+    ("misturada", []),
+    ("datas", [pd.Timestamp("2024-01-05")]),
+    ("vazia", ["Centro"]),
+    ("vazia", []),
+    ("so_nulos", ["Centro"]),
+])
+def test_mascara_valores(motor, pandas, coluna, valores):
+    esperado = pandas.mascara_valores(COLUNAS[coluna], valores)
+    obtido = motor.mascara_valores(COLUNAS[coluna], valores)
+    assert obtido.dtype == bool and np.array_equal(esperado, obtido)
+
+
+@pytest.mark.parametrize("coluna, inicio, fim", [
+    ("numeros", 0.0, 1.5),
+    ("numeros", 10.0, 20.0),
+    ("inteiros", 2, 3),
+    ("datas", pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-01 23:59:59")),
+    ("vazia", 0, 1),
+])
+def test_mascara_faixa(motor, pandas, coluna, inicio, fim):
+    esperado = pandas.mascara_faixa(COLUNAS[coluna], inicio, fim)
+    obtido = motor.mascara_faixa(COLUNAS[coluna], inicio, fim)
+    assert obtido.dtype == bool and np.array_equal(esperado, obtido)
+
+
+@pytest.mark.parametrize("selecionados", [[], [0], [0, 2, 5]])
+def test_mascara_codigos(motor, pandas, selecionados):
+    codigos = np.array([0, -1, 2, 2, 5, -1, 1], dtype=np.int32)
+    assert np.array_equal(pandas.mascara_codigos(codigos, selecionados), motor.mascara_codigos(codigos, selecionados))
+
+
+@pytest.mark.parametrize("mascara", [
+    np.ones(7, dtype=bool),
+    np.zeros(7, dtype=bool),
+    np.array([True, True, False, True, False, True, True]),
+])
+def test_contar_codigos(motor, pandas, mascara):
+    codigos = np.array([0, -1, 2, 2, 5, -1, 1], dtype=np.int32)
+    esperado = pandas.contar_codigos(codigos, mascara, 7)
+    obtido = motor.contar_codigos(codigos, mascara, 7)
+    assert np.array_equal(esperado, obtido)
+
+
+def test_contar_codigos_vazio(motor, pandas):
+    codigos = np.array([], dtype=np.int32)
+    mascara = np.array([], dtype=bool)
+    assert np.array_equal(pandas.contar_codigos(codigos, mascara, 3), motor.contar_codigos(codigos, mascara, 3))
+
+
+@pytest.mark.parametrize("dimensoes, metricas", [
+    (["Comunidade"], ["Renda"]),
+    (["Comunidade", "Problema reportado"], ["Renda", "Moradores"]),
+    (["Idade"], []),
+])
+def test_agrupar(motor, pandas, dimensoes, metricas):
+    df = gerar_dados(2000, semente=1)
+    df.loc[::11, "Comunidade"] = None
+    assert iguais_grupos(pandas.agrupar(df, dimensoes, metricas), motor.agrupar(df, dimensoes, metricas))
+
+
+def test_agrupar_quadro_vazio(motor, pandas):
+    df = gerar_dados(0)
+    esperado = pandas.agrupar(df, ["Comunidade"], ["Renda"])
+    obtido = motor.agrupar(df, ["Comunidade"], ["Renda"])
+    assert len(obtido) == 0 and list(obtido.columns) == list(esperado.columns)
+
+
+def test_agrupar_coluna_misturada(motor, pandas):
+    df = pd.DataFrame({"Código": COLUNAS["misturada"], "Valor": COLUNAS["numeros"]})
+    assert iguais_grupos(pandas.agrupar(df, ["Código"], ["Valor"]), motor.agrupar(df, ["Código"], ["Valor"]))
+
+
+QUADROS_EXPORTACAO = {
+    "nulos_e_datas": pd.DataFrame({"Comunidade": COLUNAS["texto"], "Renda": COLUNAS["numeros"], "Data": COLUNAS["datas"]}),
+    "misturada": pd.DataFrame({"Código": COLUNAS["misturada"]}),
+    "vazio": gerar_dados(0),
+}
+
+
+@pytest.mark.parametrize("quadro", QUADROS_EXPORTACAO)
+def test_exportar_csv(motor, pandas, quadro):
+    df = QUADROS_EXPORTACAO[quadro]
+    assert motor.exportar_csv(df) == pandas.exportar_csv(df)
+
+
+@pytest.mark.parametrize("quadro", QUADROS_EXPORTACAO)
+def test_exportar_parquet(motor, pandas, quadro):
+    df = QUADROS_EXPORTACAO[quadro]
+    try:
+        esperado = pandas.exportar_parquet(df)
+    except ERROS_CONVERSAO:
+        # O app mostra "Parquet indisponível" quando nem o pandas consegue gravar a coluna
+        with pytest.raises(ERROS_CONVERSAO):
+            motor.exportar_parquet(df)
+        return
+    pd.testing.assert_frame_equal(pd.read_parquet(io.BytesIO(esperado)),
+                                  pd.read_parquet(io.BytesIO(motor.exportar_parquet(df))), check_dtype=False)
@@ -0,0 +1,239 @@
+"""Teste de carga dos apps Streamlit: simula N sessões simultâneas (upload, busca, filtro, paginação e
+exportação) com as ferramentas de teste do Streamlit e mede latência, vazão e memória do processo.
+
+As sessões rodam em threads de um só processo, como no servidor do Streamlit, e compartilham os
+mesmos caches. Cada rodada começa com os caches vazios.
+
+Uso:
+    python teste_carga.py                                        # 1, 2, 4 e 8 sessões nos dois apps
+    python teste_carga.py --sessoes 1 4 16 --linhas 20000
+    python teste_carga.py --apps leitor_de_planilha.py --mesma-planilha
+"""
+import argparse
+import io
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from unittest.mock import MagicMock
+
+import numpy as np
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import element_tree
+
+from benchmark_motores import gerar_dados
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+APPS = ["leitor_de_planilha.py", "tratar_dados_excel_eco.py"]
+INTERACOES = ["upload", "busca", "filtro", "paginação", "exportação"]
+# Coluna de texto usada na busca e no filtro (é a primeira coluna dos dados gerados)
+COLUNA_BUSCA = "Comunidade"
+TERMO_BUSCA = "vila"
+
+# Script de cada sessão: diz qual planilha o upload simulado devolve e executa o app
+SCRIPT_SESSAO = """
+import streamlit as st
+st.session_state["_planilha_teste_carga"] = {planilha!r}
+exec(compile(open({app!r}, encoding="utf-8").read(), {app!r}, "exec"))
+"""
+
+
+# O AppTest reenvia a seleção dos widgets pelo texto das opções, que vão formatadas no proto
+# enquanto o valor fica cru no estado da sessão; com format_func, reenvia o índice padrão do widget
+def indices_multiselect(self):
+    if all(str(valor) in self.options for valor in self.value):
+        return [self.options.index(str(valor)) for valor in self.value]
+    return list(self.proto.default)
+
+
+indice_selectbox_original = element_tree.Selectbox.index.fget
+
+
+def indice_selectbox(self):
+    if self.value is not None and str(self.value) not in self.options:
+        return self.proto.default
+    return indice_selectbox_original(self)
+
+
+element_tree.Multiselect.indices = property(indices_multiselect)
+element_tree.Selectbox.index = property(indice_selectbox)
+
+# Cada execução do AppTest troca o Runtime global (e o apaga no fim); com sessões em paralelo,
+# todas passam a usar um único runtime simulado, como as sessões de um mesmo servidor
+runtime_servidor = MagicMock(spec=Runtime)
+runtime_servidor.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+runtime_servidor.cache_storage_manager = MemoryCacheStorageManager()
+Runtime.instance = classmethod(lambda cls: runtime_servidor)
+Runtime.exists = classmethod(lambda cls: True)
+
+
+# Upload simulado: devolve a planilha da sessão, como o arquivo enviado pelo navegador
+conteudos_planilhas = {}
+trava_planilhas = threading.Lock()
+
+
+def abrir_planilha_enviada(caminho):
+    with trava_planilhas:
+        if caminho not in conteudos_planilhas:
+            with open(caminho, "rb") as arquivo:
+                conteudos_planilhas[caminho] = arquivo.read()
+    upload = io.BytesIO(conteudos_planilhas[caminho])
+    upload.name = upload.file_id = os.path.basename(caminho)
+    upload.size = len(conteudos_planilhas[caminho])
+    return upload
+
+
+def simular_upload(*args, **kwargs):
+    caminho = st.session_state.get("_planilha_teste_carga")
+    return abrir_planilha_enviada(caminho) if caminho else None
+
+
+st.file_uploader = simular_upload
+
+
+# Função para gerar as planilhas de teste (uma por sessão, ou a mesma para todas)
+def gerar_planilhas(pasta, quantidade, linhas, mesma_planilha, rodada):
+    caminhos = []
+    for sessao in range(quantidade):
+        semente = 0 if mesma_planilha else rodada * 1000 + sessao
+        caminho = os.path.join(pasta, f"carga_{linhas}_{semente}.xlsx")
+        if not os.path.exists(caminho):
+            gerar_dados(linhas, semente).to_excel(caminho, index=False)
+        caminhos.append(caminho)
+    return caminhos
+
+
+# Função para ler a memória residente do processo (o "servidor"), em MB
+def medir_rss():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        # Sem /proc: pico de memória do processo (KB no Linux, bytes no macOS)
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 2 ** 20 if sys.platform == "darwin" else pico / 2 ** 10
+
+
+# Monitor de memória: amostra o RSS durante a rodada para registrar o pico
+class MonitorMemoria(threading.Thread):
+    def __init__(self, intervalo=0.1):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.pico = medir_rss()
+        self.parar = threading.Event()
+
+    def run(self):
+        while not self.parar.wait(self.intervalo):
+            self.pico = max(self.pico, medir_rss())
+
+
+# Funções de cada interação do roteiro (recebem o AppTest já executado)
+def buscar(at):
+    at.text_input(key=f"busca_{COLUNA_BUSCA}").set_value(TERMO_BUSCA).run()
+
+
+def filtrar(at):
+    selecao = at.multiselect(key=f"multiselect_{COLUNA_BUSCA}")
+    selecao.set_value(selecao.options[:1]).run()
+
+
+def paginar(at):
+    pagina = next(campo for campo in at.number_input if campo.label == "Página:")
+    pagina.increment().run()
+
+
+def exportar(at):
+    # O leitor gera o PDF sob demanda; os demais downloads são montados a cada execução do script
+    botao_pdf = next((botao for botao in at.button if "PDF" in botao.label), None)
+    if botao_pdf is not None:
+        botao_pdf.click().run()
+    else:
+        at.run()
+
+
+# Função que executa o roteiro de uma sessão e registra o tempo de cada interação
+def executar_sessao(app, planilha, largada, tempos, erros, timeout):
+    at = AppTest.from_string(SCRIPT_SESSAO.format(planilha=planilha, app=os.path.join(PASTA, app)),
+                             default_timeout=timeout)
+    roteiro = [("upload", lambda: at.run()), ("busca", lambda: buscar(at)), ("filtro", lambda: filtrar(at)),
+               ("paginação", lambda: paginar(at)), ("exportação", lambda: exportar(at))]
+    largada.wait()
+    for interacao, acao in roteiro:
+        inicio = time.perf_counter()
+        try:
+            acao()
+        except Exception as e:
+            erros.append(f"{interacao}: {type(e).__name__}: {e}")
+            return
+        tempos[interacao].append(time.perf_counter() - inicio)
+        falhas = [excecao.message for excecao in at.exception] + [erro.value for erro in at.error]
+        if falhas:
+            erros.append(f"{interacao}: {falhas[0]}")
+            return
+
+
+# Função para rodar N sessões simultâneas de um app
+def rodar_carga(app, planilhas, timeout):
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    tempos = defaultdict(list)
+    erros = []
+    largada = threading.Barrier(len(planilhas))
+    sessoes = [
+        threading.Thread(target=executar_sessao, args=(app, planilha, largada, tempos, erros, timeout))
+        for planilha in planilhas
+    ]
+    monitor = MonitorMemoria()
+    monitor.start()
+    inicio = time.perf_counter()
+    for sessao in sessoes:
+        sessao.start()
+    for sessao in sessoes:
+        sessao.join()
+    duracao = time.perf_counter() - inicio
+    monitor.parar.set()
+    monitor.join()
+    return tempos, erros, duracao, monitor.pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", default=APPS, help="scripts dos apps a testar")
+    parser.add_argument("--sessoes", nargs="+", type=int, default=[1, 2, 4, 8], help="números de sessões simultâneas")
+    parser.add_argument("--linhas", type=int, default=5000, help="linhas de cada planilha gerada")
+    parser.add_argument("--mesma-planilha", action="store_true",
+                        help="todas as sessões enviam a mesma planilha (caches compartilhados)")
+    parser.add_argument("--timeout", type=float, default=300, help="tempo máximo de cada execução do script (s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="teste_carga_") as pasta:
+        for app in args.apps:
+            print(f"\n=== {app} | {args.linhas} linhas por planilha | "
+                  f"{'mesma planilha' if args.mesma_planilha else 'uma planilha por sessão'} ===")
+            print(f"{'sessões':>7}  {'interação':<12}{'p50 (ms)':>10}{'p90 (ms)':>10}{'p99 (ms)':>10}{'máx (ms)':>10}")
+            for rodada, quantidade in enumerate(args.sessoes):
+                planilhas = gerar_planilhas(pasta, quantidade, args.linhas, args.mesma_planilha, rodada)
+                rss_antes = medir_rss()
+                tempos, erros, duracao, pico_rss = rodar_carga(app, planilhas, args.timeout)
+                for interacao in INTERACOES:
+                    if tempos[interacao]:
+                        p50, p90, p99 = np.percentile(tempos[interacao], [50, 90, 99]) * 1000
+                        print(f"{quantidade:>7}  {interacao:<12}{p50:>10.0f}{p90:>10.0f}{p99:>10.0f}"
+                              f"{max(tempos[interacao]) * 1000:>10.0f}")
+                total = sum(len(medidas) for medidas in tempos.values())
+                print(f"{quantidade:>7}  vazão {total / duracao:.2f} interações/s | rodada em {duracao:.1f}s | "
+                      f"RSS {rss_antes:.0f} → pico {pico_rss:.0f} MB | {len(erros)} sessão(ões) com erro")
+                for erro in erros[:3]:
+                    print(f"{'':>9}⚠️ {erro}")
+
+
+if __name__ == "__main__":
+    main()
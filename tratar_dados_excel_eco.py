@@ -4,6 +4,8 @@ import numpy as np
 from datetime import datetime
 import io
 import unicodedata
+import heapq
+import hashlib
 
 # Configuração da página
 st.set_page_config(
@@ -42,22 +44,70 @@ def criar_label_coluna(nome_coluna, dados_coluna, max_chars=30):
     
     return f"{nome_display} │ 📝 {len(dados_coluna.dropna())} valores"
 
-# Função para buscar valores similares
-def encontrar_valores_similares(valor_busca, lista_valores, limite=5):
-    """Encontra valores similares na lista (busca case insensitive e sem acentos)"""
+# Função para calcular a chave do dataset (hash do conteúdo do arquivo)
+def calcular_chave_dataset(arquivo, tamanho_bloco=1024 * 1024):
+    """Gera um hash do conteúdo do arquivo para identificar o dataset nos caches
+    
+    O hash é guardado na sessão por upload, para não reler o arquivo a cada rerun.
+    """
+    registro = st.session_state.get('chave_upload')
+    if registro is not None and registro[0] == arquivo.file_id:
+        return registro[1]
+    
+    hash_arquivo = hashlib.sha1()
+    arquivo.seek(0)
+    for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+        hash_arquivo.update(bloco)
+    arquivo.seek(0)
+    st.session_state['chave_upload'] = (arquivo.file_id, hash_arquivo.hexdigest())
+    return hash_arquivo.hexdigest()
+
+# Função para pré-calcular a frequência dos valores de uma coluna
+@st.cache_resource(show_spinner=False, max_entries=256)
+def contar_valores_coluna(_dados_coluna, chave_dataset, coluna):
+    """Conta as linhas de cada valor da coluna e guarda sua forma normalizada (uma vez por dataset)"""
+    dados = _dados_coluna.dropna().astype(str)
+    contagens = dados[~dados.isin(['', 'nan', 'NaN'])].value_counts(sort=False)
+    valores = contagens.index.tolist()
+    return {
+        'valores': valores,
+        'normalizados': [normalizar_texto(valor) for valor in valores],
+        'frequencias': contagens.to_numpy(),
+        'conjunto': set(valores),
+    }
+
+# Função para listar os valores que casam com a busca
+def filtrar_candidatos_similares(valor_busca, contagens):
+    """Varre os valores pré-normalizados e devolve as chaves de ranqueamento dos que casam com a busca"""
     if not valor_busca:
         return []
     
     valor_busca_normalizado = normalizar_texto(valor_busca)
-    similares = []
+    candidatos = []
     
-    for valor in lista_valores:
-        if valor_busca_normalizado in normalizar_texto(valor):
-            similares.append(valor)
-            if len(similares) >= limite:
-                break
+    for valor, normalizado, frequencia in zip(contagens['valores'], contagens['normalizados'], contagens['frequencias']):
+        posicao = normalizado.find(valor_busca_normalizado)
+        if posicao < 0:
+            continue
+        # Qualidade: 0 = igual, 1 = começa com o termo, 2 = contém o termo
+        if normalizado == valor_busca_normalizado:
+            qualidade = 0
+        elif posicao == 0:
+            qualidade = 1
+        else:
+            qualidade = 2
+        candidatos.append((qualidade, -int(frequencia), valor))
     
-    return similares
+    return candidatos
+
+# Função para buscar valores similares
+def encontrar_valores_similares(candidatos, limite=5):
+    """Retorna os `limite` melhores valores, ordenados por qualidade da busca e frequência"""
+    return [valor for _, _, valor in heapq.nsmallest(limite, candidatos)]
+
+# Callback do botão "mostrar mais": amplia o top-k sem refazer a varredura
+def mostrar_mais_sugestoes(estado_sugestoes):
+    estado_sugestoes['limite'] += estado_sugestoes['passo']
 
 # Upload do arquivo
 uploaded_file = st.file_uploader("📤 Envie sua planilha Excel", type=["xlsx"])
@@ -66,6 +116,7 @@ if uploaded_file:
     try:
         # Ler o arquivo Excel
         df = pd.read_excel(uploaded_file)
+        chave_dataset = calcular_chave_dataset(uploaded_file)
         
         # Remover colunas completamente vazias
         df = df.dropna(axis=1, how='all')
@@ -79,6 +130,13 @@ if uploaded_file:
         
         # Sidebar para filtros
         st.sidebar.header("🔍 Filtros de Consulta")
+        limite_sugestoes = st.sidebar.number_input(
+            "Sugestões por busca",
+            min_value=1,
+            max_value=100,
+            value=5,
+            help="Quantidade de valores mostrados por vez na busca de valores (os mais frequentes primeiro)"
+        )
         
         # Criar labels descritivos para todas as colunas
         colunas_com_labels = []
@@ -110,8 +168,8 @@ if uploaded_file:
                 if len(df[coluna].dropna()) > 0:
                     # Para colunas textuais - SEMPRE permitir seleção múltipla
                     if df[coluna].dtype in ['object', 'string']:
-                        valores_unicos = df[coluna].dropna().unique()
-                        valores_unicos = [str(x) for x in valores_unicos if str(x) not in ['', 'nan', 'NaN']]
+                        contagens = contar_valores_coluna(df[coluna], chave_dataset, coluna)
+                        valores_unicos = contagens['valores']
                         
                         if len(valores_unicos) > 0:
                             # Sistema de busca + seleção múltipla para TODAS as colunas textuais
@@ -129,27 +187,59 @@ if uploaded_file:
                             valores_disponiveis = sorted(valores_unicos)
                             
                             if busca_texto:
-                                valores_similares = encontrar_valores_similares(busca_texto, valores_unicos)
+                                # Candidatos ficam guardados por termo e planilha: "mostrar mais" só amplia o top-k
+                                estado_sugestoes = st.session_state.get(f"sugestoes_{coluna}")
+                                if (estado_sugestoes is None or estado_sugestoes['termo'] != busca_texto
+                                        or estado_sugestoes['passo'] != limite_sugestoes
+                                        or estado_sugestoes.get('dataset') != chave_dataset):
+                                    estado_sugestoes = {
+                                        'dataset': chave_dataset,
+                                        'termo': busca_texto,
+                                        'candidatos': filtrar_candidatos_similares(busca_texto, contagens),
+                                        'passo': limite_sugestoes,
+                                        'limite': limite_sugestoes,
+                                    }
+                                    st.session_state[f"sugestoes_{coluna}"] = estado_sugestoes
+                                
+                                candidatos = estado_sugestoes['candidatos']
+                                valores_similares = [v for v in encontrar_valores_similares(candidatos, estado_sugestoes['limite'])
+                                                     if v in contagens['conjunto']]
                                 if valores_similares:
-                                    st.sidebar.success(f"🎯 {len(valores_similares)} valor(es) encontrado(s)")
-                                    valores_disponiveis = valores_similares
+                                    st.sidebar.success(f"🎯 {len(valores_similares)} de {len(candidatos)} valor(es) encontrado(s)")
+                                    # Manter os valores já selecionados entre as opções (só os que existem nesta planilha)
+                                    selecionados = [v for v in st.session_state.get(f"selecao_{coluna}", [])
+                                                    if v in contagens['conjunto'] and v not in valores_similares]
+                                    valores_disponiveis = selecionados + valores_similares
+                                    
+                                    if len(candidatos) > estado_sugestoes['limite']:
+                                        st.sidebar.button(
+                                            "➕ Mostrar mais",
+                                            key=f"mais_{coluna}",
+                                            on_click=mostrar_mais_sugestoes,
+                                            args=(estado_sugestoes,)
+                                        )
                                 else:
                                     st.sidebar.warning("❌ Nenhum valor encontrado")
-                                    valores_disponiveis = []
+                                    valores_disponiveis = [v for v in st.session_state.get(f"selecao_{coluna}", []) if v in contagens['conjunto']]
                             
-                            # Seleção múltipla sempre disponível
+                            # Seleção múltipla sempre disponível. As opções mudam com a busca e o "mostrar mais"
+                            # (o que recria o widget), então a seleção é guardada à parte e volta como default
+                            selecao_anterior = [v for v in st.session_state.get(f"selecao_{coluna}", []) if v in contagens['conjunto']]
+                            valores_disponiveis = selecao_anterior + [v for v in valores_disponiveis if v not in selecao_anterior]
                             selecao = st.sidebar.multiselect(
                                 f"**Selecione os valores para {coluna}:**",
                                 options=valores_disponiveis,
-                                default=[],
+                                default=selecao_anterior,
                                 help="💡 **DICA:** Selecione múltiplas variações (com/sem acento, maiúsculas/minúsculas)",
                                 key=f"multiselect_{coluna}"
                             )
+                            st.session_state[f"selecao_{coluna}"] = selecao
                             
                             # Sugestões automáticas para valores comuns
                             if not busca_texto and not selecao:
-                                # Mostrar valores mais frequentes como sugestão
-                                valores_frequentes = df[coluna].value_counts().head(3).index.tolist()
+                                # Mostrar valores mais frequentes como sugestão (a partir das contagens pré-calculadas)
+                                mais_frequentes = heapq.nlargest(3, zip(contagens['frequencias'], contagens['valores']))
+                                valores_frequentes = [valor for _, valor in mais_frequentes]
                                 if valores_frequentes:
                                     st.sidebar.caption(f"💡 Sugestões: {', '.join(map(str, valores_frequentes))}")
                             
@@ -200,6 +290,9 @@ if uploaded_file:
         with col_btn1:
             if st.button("🧹 Limpar Filtros", use_container_width=True):
                 filtros_aplicados = {}
+                # A seleção guardada voltaria como default dos widgets
+                for chave in [c for c in st.session_state.keys() if c.startswith(('selecao_', 'multiselect_'))]:
+                    del st.session_state[chave]
                 st.rerun()
         with col_btn2:
             if st.button("🔄 Recarregar", use_container_width=True):